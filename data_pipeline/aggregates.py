@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+多窗口趋势聚合：按梗维护1/7/30/90天窗口的热度汇总，追加一天数据时增量更新，
+热榜、图表以及上升/回落榜单直接读取物化结果，无需每次扫描全部历史
+"""
+
+import heapq
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from config import Config
+from history_frame import HistoryFrame
+
+
+class TrendAggregates:
+    FILENAME = "trend_aggregates.json"
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir if data_dir else Config.DATA_DIR
+        self.file_path = os.path.join(self.data_dir, self.FILENAME)
+        self.windows = tuple(Config.AGGREGATE_WINDOWS)
+        self.reset()
+
+    def reset(self):
+        """清空所有聚合状态"""
+        self.last_date = None
+        self.by_date = {}  # 日期 -> {梗的名称: 当日热度}，只保留最大窗口内的天数
+        self.stats = {w: {} for w in self.windows}  # 窗口 -> {梗的名称: [热度和, 热度峰值, 上榜天数]}
+        self.rankings = {}
+        self.latest_rows = []
+        self.total_rows = 0
+        self.history_stat = None
+
+    # ---------- 日期窗口 ----------
+
+    @staticmethod
+    def _plain(value):
+        """转换为可JSON序列化的原生类型"""
+        if pd.isna(value):
+            return None
+        if isinstance(value, pd.Timestamp):
+            return value.strftime('%Y-%m-%d')
+        return value.item() if hasattr(value, 'item') else value
+
+    @staticmethod
+    def _to_date(date_str):
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+
+    def _in_window(self, date_str, window, last_date=None):
+        """判断某天是否落在以last_date结尾的window天窗口内"""
+        last_date = last_date or self.last_date
+        if last_date is None:
+            return False
+        delta = (self._to_date(last_date) - self._to_date(date_str)).days
+        return 0 <= delta < window
+
+    def _window_max(self, window, meme, exclude=None):
+        """在窗口内的逐日数据中重新求某个梗的热度峰值"""
+        return max(
+            (heats.get(meme, 0) for date, heats in self.by_date.items()
+             if date != exclude and self._in_window(date, window)),
+            default=0,
+        )
+
+    # ---------- 增量更新 ----------
+
+    def _add_day(self, window, date):
+        stats = self.stats[window]
+        for meme, heat in self.by_date[date].items():
+            entry = stats.setdefault(meme, [0.0, 0.0, 0])
+            entry[0] += heat
+            entry[1] = max(entry[1], heat)
+            entry[2] += 1
+
+    def _subtract_day(self, window, date):
+        stats = self.stats[window]
+        for meme, heat in self.by_date[date].items():
+            entry = stats.get(meme)
+            if entry is None:
+                continue
+            entry[0] -= heat
+            entry[2] -= 1
+            if entry[2] <= 0:
+                del stats[meme]
+            elif heat >= entry[1]:
+                entry[1] = self._window_max(window, meme, exclude=date)
+
+    def _advance(self, new_date):
+        """推进最新日期，把滑出各窗口的天数从汇总中扣除"""
+        old_date = self.last_date
+        self.last_date = new_date
+        if old_date is None:
+            return
+        for date in list(self.by_date):
+            for window in self.windows:
+                if self._in_window(date, window, old_date) and not self._in_window(date, window):
+                    self._subtract_day(window, date)
+
+    def _prune(self):
+        """丢弃超出最大窗口的逐日数据"""
+        longest = max(self.windows)
+        for date in list(self.by_date):
+            if not self._in_window(date, longest):
+                del self.by_date[date]
+
+    def append_day(self, date, data, rank=True):
+        """追加（或替换）一天的数据，data为DataFrame或记录列表"""
+        records = data.to_dict('records') if isinstance(data, pd.DataFrame) else list(data)
+
+        heats = {}
+        for row in records:
+            heat = float(row['热度']) if pd.notna(row['热度']) else 0.0
+            heats[row['梗的名称']] = max(heats.get(row['梗的名称'], 0.0), heat)
+
+        # 同一天重复运行时先撤销旧数据
+        if date in self.by_date:
+            for window in self.windows:
+                if self._in_window(date, window):
+                    self._subtract_day(window, date)
+            self.total_rows -= len(self.by_date[date])
+
+        if self.last_date is None or date > self.last_date:
+            self._advance(date)
+
+        self.by_date[date] = heats
+        self.total_rows += len(heats)
+        for window in self.windows:
+            if self._in_window(date, window):
+                self._add_day(window, date)
+
+        if date == self.last_date:
+            self.latest_rows = [
+                {key: self._plain(value) for key, value in row.items()}
+                for row in records
+            ]
+
+        self._prune()
+        if rank:
+            self._rank()
+
+    def rebuild(self, df):
+        """从完整历史数据重建聚合（首次运行或历史文件被外部修改时使用）"""
+        self.reset()
+        if df is None or df.empty:
+            return
+
+        date_keys = HistoryFrame.date_strings(df['更新日期'])
+        dates = sorted(date_keys.unique())
+        last_date = dates[-1]
+        longest = max(self.windows)
+        for date in dates:
+            if self._in_window(date, longest, last_date):
+                self.append_day(date, df[date_keys == date], rank=False)
+
+        self.total_rows = len(df)
+        self._rank()
+
+    # ---------- 物化榜单 ----------
+
+    def _rank(self):
+        """在追加数据时物化各窗口的热门、上升、回落榜单"""
+        top_n = Config.AGGREGATE_TOP_N
+        today = self.stats.get(1, {})
+        self.rankings = {}
+
+        for window, stats in self.stats.items():
+            hot = heapq.nlargest(top_n, stats.items(), key=lambda item: item[1][1])
+
+            # 趋势分数：最新一天热度相对窗口日均热度（未上榜的天数记为0）的变化
+            scores = []
+            if window > 1:
+                for meme, (total, _, _) in stats.items():
+                    mean = total / window
+                    if mean > 0:
+                        latest = today[meme][1] if meme in today else 0.0
+                        scores.append((meme, (latest - mean) / mean, latest, mean))
+
+            # 分数相同时，上升榜优先最新热度高的，回落榜优先窗口日均高的
+            rising = heapq.nlargest(top_n, (item for item in scores if item[1] > 0), key=lambda item: (item[1], item[2]))
+            fading = heapq.nsmallest(top_n, (item for item in scores if item[1] < 0), key=lambda item: (item[1], -item[3]))
+
+            self.rankings[window] = {
+                'hot': [meme for meme, _ in hot],
+                'rising': [item[0] for item in rising],
+                'fading': [item[0] for item in fading],
+            }
+
+    def _ranking(self, kind, window, k):
+        ranking = self.rankings.get(window, {}).get(kind, [])
+        stats = self.stats.get(window, {})
+        return [
+            {'name': meme, 'sum': stats[meme][0], 'max': stats[meme][1], 'days': stats[meme][2]}
+            for meme in ranking[:k]
+        ]
+
+    def top(self, window, k=10):
+        """窗口内热度峰值最高的k个梗"""
+        return self._ranking('hot', window, k)
+
+    def rising(self, window=7, k=10):
+        """最新一天热度明显高于窗口日均的k个梗"""
+        return self._ranking('rising', window, k)
+
+    def fading(self, window=7, k=10):
+        """最新一天热度明显低于窗口日均的k个梗"""
+        return self._ranking('fading', window, k)
+
+    def recent_dates(self, n):
+        """最近n个有数据的日期"""
+        return sorted(self.by_date)[-n:]
+
+    def heat_on(self, meme, date):
+        """某个梗在某天的热度，无数据时返回None"""
+        return self.by_date.get(date, {}).get(meme)
+
+    # ---------- 持久化 ----------
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+            return [st.st_mtime_ns, st.st_size]
+        except OSError:
+            return None
+
+    def is_fresh(self, history_file):
+        """聚合是否与历史文件保持一致"""
+        return self.history_stat is not None and self.history_stat == self._stat(history_file)
+
+    def load(self):
+        """从磁盘加载聚合状态"""
+        if not os.path.exists(self.file_path):
+            return False
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('windows') != list(self.windows):
+                return False
+
+            self.last_date = state['last_date']
+            self.by_date = state['by_date']
+            self.stats = {w: state['stats'][str(w)] for w in self.windows}
+            self.rankings = {w: state['rankings'][str(w)] for w in self.windows if str(w) in state['rankings']}
+            self.latest_rows = state['latest_rows']
+            self.total_rows = state['total_rows']
+            self.history_stat = state.get('history_stat')
+            return True
+        except Exception as e:
+            print(f"加载趋势聚合失败: {e}")
+            self.reset()
+            return False
+
+    def save(self, history_file=None):
+        """保存聚合状态，history_file用于记录与之对应的历史文件版本"""
+        if history_file:
+            self.history_stat = self._stat(history_file)
+
+        state = {
+            'windows': list(self.windows),
+            'last_date': self.last_date,
+            'by_date': self.by_date,
+            'stats': {str(w): stats for w, stats in self.stats.items()},
+            'rankings': {str(w): ranking for w, ranking in self.rankings.items()},
+            'latest_rows': self.latest_rows,
+            'total_rows': self.total_rows,
+            'history_stat': self.history_stat,
+        }
+
+        try:
+            tmp_path = self.file_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.file_path)
+            return True
+        except Exception as e:
+            print(f"保存趋势聚合失败: {e}")
+            return False
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+原始数据归档：按来源和日期把每次抓取的原始响应压缩追加到归档文件，
+SQLite索引记录每条归档的位置、哈希以及ETag/Last-Modified，
+用于条件请求、跳过未变化的数据，以及离线重新处理历史数据
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from config import Config
+
+
+class PayloadArchive:
+    INDEX_FILENAME = "index.sqlite"
+
+    def __init__(self, archive_dir=None):
+        self.archive_dir = archive_dir if archive_dir else Config.ARCHIVE_DIR
+        if not os.path.exists(self.archive_dir):
+            os.makedirs(self.archive_dir)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.archive_dir, self.INDEX_FILENAME), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS payloads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                fetched_at TEXT NOT NULL,
+                url TEXT,
+                file TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_payloads_source_time ON payloads (source, fetched_at)")
+        self.conn.commit()
+
+    def latest(self, source):
+        """某个来源最近一次归档的索引记录"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM payloads WHERE source = ? ORDER BY id DESC LIMIT 1", (source,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def conditional_headers(self, source):
+        """根据上次归档的ETag/Last-Modified构造条件请求头"""
+        latest = self.latest(source)
+        headers = {}
+        if latest and latest['etag']:
+            headers['If-None-Match'] = latest['etag']
+        if latest and latest['last_modified']:
+            headers['If-Modified-Since'] = latest['last_modified']
+        return headers
+
+    def append(self, source, url, content, etag=None, last_modified=None, fetched_at=None):
+        """归档一次抓取的原始内容，内容与上次相同时不写入并返回False"""
+        sha256 = hashlib.sha256(content).hexdigest()
+        latest = self.latest(source)
+        if latest and latest['sha256'] == sha256:
+            # 内容未变但服务端换了ETag/Last-Modified时更新校验值，使后续条件请求能命中304
+            if (etag, last_modified) != (latest['etag'], latest['last_modified']):
+                with self.lock:
+                    self.conn.execute(
+                        "UPDATE payloads SET etag = ?, last_modified = ? WHERE id = ?",
+                        (etag, last_modified, latest['id']),
+                    )
+                    self.conn.commit()
+            return False
+
+        fetched_at = fetched_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        relative_file = os.path.join(source, f"{fetched_at[:10]}.gz")
+        file_path = os.path.join(self.archive_dir, relative_file)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        # 每条记录是一个独立的gzip成员，可按偏移量单独解压
+        compressed = gzip.compress(content)
+        with self.lock:
+            with open(file_path, 'ab') as f:
+                f.seek(0, os.SEEK_END)
+                offset = f.tell()
+                f.write(compressed)
+            self.conn.execute(
+                "INSERT INTO payloads (source, fetched_at, url, file, offset, length, sha256, etag, last_modified) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (source, fetched_at, url, relative_file, offset, len(compressed), sha256, etag, last_modified),
+            )
+            self.conn.commit()
+        return True
+
+    def read(self, record):
+        """按索引记录读取原始内容"""
+        with open(os.path.join(self.archive_dir, record['file']), 'rb') as f:
+            f.seek(record['offset'])
+            return gzip.decompress(f.read(record['length']))
+
+    def load_json(self, record):
+        return json.loads(self.read(record))
+
+    def records(self, source=None, start=None, end=None):
+        """按来源和时间范围（含端点，'YYYY-MM-DD'或完整时间）查询索引记录"""
+        query = "SELECT * FROM payloads WHERE 1 = 1"
+        params = []
+        if source:
+            query += " AND source = ?"
+            params.append(source)
+        if start:
+            query += " AND fetched_at >= ?"
+            params.append(start)
+        if end:
+            query += " AND fetched_at <= ?"
+            params.append(end if len(end) > 10 else f"{end} 23:59:59")
+        query += " ORDER BY fetched_at, id"
+
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(query, params).fetchall()]
+
+    def iter_payloads(self, source=None, start=None, end=None):
+        """依次返回(索引记录, 解析后的JSON)"""
+        for record in self.records(source, start, end):
+            yield record, self.load_json(record)
+
+    def last_payload_on(self, source, date):
+        """某个来源在某天最后一次归档的内容"""
+        records = self.records(source, date, date)
+        return self.load_json(records[-1]) if records else None
+
+    def prune(self, cutoff):
+        """删除早于cutoff（'YYYY-MM-DD'）的归档文件及其索引记录，
+        各来源最近一次的归档始终保留（条件请求返回304时需要读取），返回删除的文件数"""
+        with self.lock:
+            latest_files = {
+                row['file'] for row in self.conn.execute(
+                    "SELECT file FROM payloads WHERE id IN (SELECT MAX(id) FROM payloads GROUP BY source)"
+                ).fetchall()
+            }
+            files = [
+                row['file'] for row in self.conn.execute(
+                    "SELECT DISTINCT file FROM payloads WHERE fetched_at < ?", (cutoff,)
+                ).fetchall()
+                if row['file'] not in latest_files
+            ]
+            for relative_file in files:
+                self.conn.execute("DELETE FROM payloads WHERE file = ?", (relative_file,))
+            self.conn.commit()
+
+            for relative_file in files:
+                file_path = os.path.join(self.archive_dir, relative_file)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+        return len(files)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
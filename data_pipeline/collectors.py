@@ -3,20 +3,49 @@ from bs4 import BeautifulSoup
 from datetime import datetime
 from openai import OpenAI
 from config import Config
+from archive import PayloadArchive
 
 class MemeCollector:
-    def __init__(self, openai_api_key=None):
+    # 来源标识 -> 采集方法，供常驻模式按来源单独轮询
+    SOURCES = {
+        'weibo': 'collect_weibo_hot_topics',
+        'bilibili': 'collect_bilibili_hot_topics',
+    }
+    # 来源标识 -> 原始数据解析方法，供重新处理归档数据
+    PARSERS = {
+        'weibo': 'parse_weibo_hot_topics',
+        'bilibili': 'parse_bilibili_hot_topics',
+    }
+
+    def __init__(self, openai_api_key=None, session=None, openai_client=None, archive=None):
         self.today = datetime.now().strftime("%Y-%m-%d")
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         self.memes_data = []
         
+        # 复用HTTP连接池（常驻模式下跨轮次保持连接）
+        self.session = session or requests.Session()
+        
+        # 原始数据归档（同时提供条件请求所需的ETag/Last-Modified和内容哈希）
+        self.archive = archive
+        if self.archive is None and Config.ARCHIVE_ENABLED:
+            self.archive = PayloadArchive()
+        self.skip_unchanged = False
+        self.source_changed = {}
+        self.source_errors = {}
+        
+        # 队列模式下先收集候选话题，由工作进程统一判断
+        self.defer_classification = False
+        self.pending_classification = []
+        
         # 初始化OpenAI客户端
-        self.openai_client = None
+        self.openai_client = openai_client
         api_key = openai_api_key or Config.get_openai_api_key()
         
-        if api_key:
+        if self.openai_client:
+            print("✅ 已启用LLM梗检测功能")
+        elif api_key:
             self.openai_client = OpenAI(
                 api_key=api_key,
                 base_url=Config.get_openai_base_url()
@@ -28,63 +57,91 @@ class MemeCollector:
         # 缓存LLM判断结果，避免重复调用
         self.meme_cache = {}
     
+    def fetch_json(self, source, url):
+        """抓取JSON并归档原始内容，返回(数据, 与上次相比是否变化)"""
+        headers = dict(self.headers)
+        if self.archive:
+            headers.update(self.archive.conditional_headers(source))
+        
+        response = self.session.get(url, headers=headers, timeout=Config.REQUEST_TIMEOUT)
+        
+        # 304：服务端确认未变化，直接使用上次归档的内容
+        if response.status_code == 304 and self.archive:
+            latest = self.archive.latest(source)
+            if latest:
+                self.source_changed[source] = False
+                return self.archive.load_json(latest), False
+        
+        data = response.json()
+        changed = True
+        if self.archive:
+            changed = self.archive.append(
+                source, url, response.content,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+        self.source_changed[source] = changed
+        return data, changed
+    
     def collect_weibo_hot_topics(self):
         """从微博热搜采集热门话题"""
         try:
             url = "https://weibo.com/ajax/side/hotSearch"
-            response = requests.get(url, headers=self.headers)
-            data = response.json()
-            
-            if data and 'data' in data and 'realtime' in data['data']:
-                hot_topics = data['data']['realtime']
-                for topic in hot_topics[:Config.MAX_TOPICS_PER_SOURCE]:  # 获取热搜
-                    if self._is_meme(topic['word']):
-                        self.memes_data.append({
-                            'name': topic['word'],
-                            'heat': topic['num'],
-                            'source': '微博热搜'
-                        })
+            data, changed = self.fetch_json('weibo', url)
+            if changed or not self.skip_unchanged:
+                self.parse_weibo_hot_topics(data)
             return len(self.memes_data)
         except Exception as e:
             print(f"微博热搜采集错误: {e}")
+            self.source_errors['weibo'] = e
             return 0
     
+    def parse_weibo_hot_topics(self, data):
+        """解析微博热搜原始数据"""
+        if data and 'data' in data and 'realtime' in data['data']:
+            hot_topics = data['data']['realtime']
+            for topic in hot_topics[:Config.MAX_TOPICS_PER_SOURCE]:  # 获取热搜
+                if self._is_meme(topic['word']):
+                    self.memes_data.append({
+                        'name': topic['word'],
+                        'heat': topic['num'],
+                        'source': '微博热搜'
+                    })
+        return len(self.memes_data)
+    
     def collect_bilibili_hot_topics(self):
         """从B站热门话题采集"""
         try:
             url = f"https://api.bilibili.com/x/web-interface/search/square?limit={Config.BILIBILI_API_LIMIT}"
-            response = requests.get(url, headers=self.headers)
-            data = response.json()
-            
-            if data and data['code'] == 0 and 'data' in data:
-                trending = data['data']['trending']
-                for topic in trending['list']:
-                    if self._is_meme(topic['keyword']):
-                        self.memes_data.append({
-                            'name': topic['keyword'],
-                            'heat': topic['heat_score'],
-                            'source': 'B站热搜'
-                        })
+            data, changed = self.fetch_json('bilibili', url)
+            if changed or not self.skip_unchanged:
+                self.parse_bilibili_hot_topics(data)
             return len(self.memes_data)
         except Exception as e:
             print(f"B站热搜采集错误: {e}")
+            self.source_errors['bilibili'] = e
             return 0
     
-    def _is_meme(self, text):
-        """使用大模型判断一个话题是否为网络梗"""
-        # 检查缓存
-        if text in self.meme_cache:
-            return self.meme_cache[text]
-        
-        # 如果没有OpenAI客户端，直接返回True（输出所有热点）
+    def parse_bilibili_hot_topics(self, data):
+        """解析B站热搜原始数据"""
+        if data and data['code'] == 0 and 'data' in data:
+            trending = data['data']['trending']
+            for topic in trending['list']:
+                if self._is_meme(topic['keyword']):
+                    self.memes_data.append({
+                        'name': topic['keyword'],
+                        'heat': topic['heat_score'],
+                        'source': 'B站热搜'
+                    })
+        return len(self.memes_data)
+    
+    def classify_with_llm(self, text):
+        """调用大模型判断话题是否为网络梗，失败时抛出异常（不使用容错结果，也不写入缓存）"""
         if not self.openai_client:
-            print(f"LLM不可用，直接输出热点: '{text}'")
-            self.meme_cache[text] = True
-            return True
+            raise RuntimeError("LLM不可用")
         
-        try:
-            # 构建prompt
-            prompt = f"""
+        # 构建prompt
+        prompt = f"""
 请判断以下文本是否是一个"网络梗"。
 
 网络梗的定义：普罗大众都知道的一个有趣的事件、短语、表达方式或者流行语，通常具有幽默性、娱乐性，在网络上广泛传播并被大家理解和使用。
@@ -106,19 +163,40 @@ class MemeCollector:
 
 请只回答"是"或"否"，不要解释。
 """
-            
-            response = self.openai_client.chat.completions.create(
-                model=Config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "你是识别网络梗的助手，能够准确判断一个词语或短语是否为网络梗。"},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=Config.OPENAI_MAX_TOKENS,
-                temperature=Config.OPENAI_TEMPERATURE
-            )
-            
-            result = response.choices[0].message.content.strip()
-            is_meme = result == "是"
+        
+        response = self.openai_client.chat.completions.create(
+            model=Config.OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": "你是识别网络梗的助手，能够准确判断一个词语或短语是否为网络梗。"},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=Config.OPENAI_MAX_TOKENS,
+            temperature=Config.OPENAI_TEMPERATURE
+        )
+        
+        result = response.choices[0].message.content.strip()
+        return result == "是"
+    
+    def _is_meme(self, text):
+        """使用大模型判断一个话题是否为网络梗"""
+        # 检查缓存
+        if text in self.meme_cache:
+            return self.meme_cache[text]
+        
+        # 队列模式：记录候选话题，暂时全部保留，判断结果回写后再过滤
+        if self.defer_classification:
+            if text not in self.pending_classification:
+                self.pending_classification.append(text)
+            return True
+        
+        # 如果没有OpenAI客户端，直接返回True（输出所有热点）
+        if not self.openai_client:
+            print(f"LLM不可用，直接输出热点: '{text}'")
+            self.meme_cache[text] = True
+            return True
+        
+        try:
+            is_meme = self.classify_with_llm(text)
             
             # 缓存结果
             self.meme_cache[text] = is_meme
@@ -130,6 +208,47 @@ class MemeCollector:
             self.meme_cache[text] = True
             return True
     
+    def classify_pending(self, raw_data):
+        """在当前进程中判断延迟的候选话题，并过滤采集结果"""
+        self.defer_classification = False
+        for text in self.pending_classification:
+            self._is_meme(text)
+        self.pending_classification = []
+        return [item for item in raw_data if self.meme_cache.get(item['name'], True)]
+    
+    def collect_source(self, source, skip_unchanged=False):
+        """采集单个来源，返回该来源本轮的数据；skip_unchanged时原始数据未变化则返回None，
+        抓取失败时抛出RuntimeError，避免把失败当作空结果"""
+        self.memes_data = []
+        self.skip_unchanged = skip_unchanged
+        self.source_changed.pop(source, None)
+        self.source_errors.pop(source, None)
+        try:
+            getattr(self, self.SOURCES[source])()
+        finally:
+            self.skip_unchanged = False
+        
+        if source in self.source_errors:
+            raise RuntimeError(f"来源 {source} 采集失败: {self.source_errors[source]}")
+        if skip_unchanged and self.source_changed.get(source) is False:
+            return None
+        return list(self.memes_data)
+    
+    def replay(self, date):
+        """用归档中某天各来源最后一次的原始数据重新采集，不重新抓取热搜"""
+        self.memes_data = []
+        if not self.archive:
+            print("未启用原始数据归档，无法重新处理")
+            return self.memes_data
+        
+        for source, parser in self.PARSERS.items():
+            payload = self.archive.last_payload_on(source, date)
+            if payload is None:
+                print(f"{date} 没有 {source} 的归档数据")
+                continue
+            getattr(self, parser)(payload)
+        return self.memes_data
+    
     def run_all_collectors(self):
         """运行所有采集器"""
         self.collect_weibo_hot_topics()
@@ -12,15 +12,80 @@ class Config:
     MAX_MEME_LENGTH = 20
     ENABLE_LLM_MEME_DETECTION = True
     
+    # jieba兜底关键词提取配置
+    JIEBA_MAX_TERM_LENGTH = 4  # 不超过该长度的完整梗名（如"遥遥领先"）直接收入领域词典
+    JIEBA_MIN_TERM_NAMES = 2  # 片段至少出现在多少个梗名中才收入领域词典
+    JIEBA_MAX_MERGE_TOKENS = 4  # 领域词最多由几个默认切分的相邻词拼接而成
+    JIEBA_MAX_PHRASE_LENGTH = 8  # 反复出现的短语最长字数（长于完整梗名上限，用于识别被截断的片段）
+    JIEBA_STOP_WORDS = [  # 与jieba.analyse自带的停用词一起使用，含这些词的片段不收入领域词典
+        '的', '地', '得', '了', '着', '过', '吗', '呢', '吧', '啊', '呀', '哦', '嘛',
+        '是', '和', '与', '及', '或', '被', '把', '这', '那', '这个', '那个', '这样', '那样',
+        '什么', '为什么', '怎么', '怎样', '如何', '哪', '哪里', '一个',
+    ]
+    
     # 数据采集配置
     MAX_TOPICS_PER_SOURCE = 30
     REQUEST_TIMEOUT = 10
     BILIBILI_API_LIMIT = 10
     
+    # 趋势聚合配置
+    AGGREGATE_WINDOWS = [1, 7, 30, 90]  # 聚合窗口（天）
+    AGGREGATE_TOP_N = 50  # 每个窗口物化的榜单长度
+    
+    # 突增检测配置
+    SPIKE_EWMA_ALPHA = 0.3  # EWMA平滑系数
+    SPIKE_WINDOW = 6  # 计算斜率的最近采样次数
+    SPIKE_MIN_SAMPLES = 3  # 至少有这么多样本后才计算z分数
+    SPIKE_Z_THRESHOLD = 2.5  # z分数超过该值视为突增
+    SPIKE_SLOPE_THRESHOLD = 0.1  # 相对均值每小时增长超过10%视为突增
+    SPIKE_FRESHNESS_HOURS = 2  # 只展示最近这段时间内判定的突增
+    SPIKE_STATE_TTL_DAYS = 30  # 超过该天数未出现的梗清除状态
+    
+    # 小程序分片数据配置
+    SHARD_DIR_NAME = "shards"  # 小程序data目录下的分片子目录
+    HOT_LIST_PAGE_SIZE = 10
+    SEARCH_INDEX_BUCKETS = 64  # 搜索索引按首字符编码取模分桶
+    SEARCH_MAX_PREFIX = 6
+    SEARCH_NGRAM_SIZES = (1, 2)
+    SEARCH_MAX_POSTINGS = 50  # 每个搜索词最多返回的结果数
+    
+    # 历史数据保留配置
+    RETENTION_DAILY_DAYS = 90  # 保留逐日明细的天数（不少于最长聚合窗口）
+    RETENTION_WEEKLY_DAYS = 365  # 周汇总保留天数，更早的并入月汇总
+    RETENTION_MONTHLY_MONTHS = 60  # 月汇总保留月数，None表示永久保留
+    RETENTION_DAILY_FILE_DAYS = 7  # 每日CSV保留天数
+    RETENTION_ARCHIVE_DAYS = 90  # 原始数据归档保留天数，None表示永久保留
+    RETENTION_COMPACT_INTERVAL = 86400  # 常驻模式下后台压缩间隔（秒）
+    
+    # 原始数据归档配置
+    ARCHIVE_ENABLED = True
+    
+    # 工作队列配置（--queue）
+    QUEUE_DB = "collector_output/work_queue.sqlite"  # 多台机器共享时放在共享存储上
+    QUEUE_LEASE_SECONDS = 120  # 任务租约，超时未完成的任务可被其他进程重新领取
+    QUEUE_MAX_ATTEMPTS = 3
+    QUEUE_RESULT_TTL_DAYS = 7  # 已完成任务的结果保留天数，过期后重新执行
+    QUEUE_WAIT_TIMEOUT = 600  # 协调进程等待结果的最长时间（秒）
+    QUEUE_POLL_INTERVAL = 1.0
+    QUEUE_COORDINATOR_WORKS = True  # 等待期间协调进程自己也执行任务，没有工作进程时不会卡住
+    
+    # 常驻模式配置（--daemon）
+    SOURCE_POLL_INTERVALS = {  # 各来源轮询间隔（秒）
+        'weibo': 600,
+        'bilibili': 900,
+    }
+    DAEMON_HEALTH_HOST = "127.0.0.1"
+    DAEMON_HEALTH_PORT = 8765
+    
+    # 性能分析配置（--profile / --profile-memory）
+    PROFILE_DIR_PREFIX = "profile_"  # 每次运行在日志目录下生成 profile_YYYYMMDD_HHMMSS 目录
+    PROFILE_TOP_N = 30  # 摘要中列出的函数/内存分配位置数量
+    
     # 路径配置（相对路径）
     OUTPUT_BASE_DIR = "collector_output"
     LOG_DIR = "collector_output/logs"
     DATA_DIR = "collector_output/data"
+    ARCHIVE_DIR = "collector_output/raw_archive"
     
     @classmethod
     def get_openai_api_key(cls):
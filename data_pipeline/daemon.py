@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+常驻模式：进程内调度各来源的轮询，在多轮之间保持历史数据、
+LLM判断缓存以及HTTP/LLM连接池常驻，避免每次冷启动的开销
+"""
+
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from collectors import MemeCollector
+from processor import MemeProcessor
+from storage import MemeStorage
+from data_converter import DataConverter
+from aggregates import TrendAggregates
+from retention import HistoryRetention
+from history_frame import HistoryFrame
+from keywords import KeywordExtractor
+from spikes import SpikeDetector
+from config import Config
+
+logger = logging.getLogger('meme_pipeline')
+
+
+class MemeDaemon:
+    def __init__(self, data_dir=None, health_host=None, health_port=None):
+        self.data_dir = data_dir if data_dir else Config.DATA_DIR
+        self.health_host = health_host or Config.DAEMON_HEALTH_HOST
+        self.health_port = health_port if health_port is not None else Config.DAEMON_HEALTH_PORT
+
+        # 常驻组件：采集器持有HTTP会话和梗判断缓存，处理器共享同一个LLM客户端并持有解释缓存
+        self.collector = MemeCollector()
+        self.keyword_extractor = KeywordExtractor(self.data_dir)
+        self.processor = MemeProcessor(
+            [], openai_client=self.collector.openai_client, keyword_extractor=self.keyword_extractor
+        )
+        self.converter = DataConverter(self.data_dir)
+        self.retention = HistoryRetention(self.data_dir, archive=self.collector.archive)
+        self.spike_detector = SpikeDetector(self.data_dir)
+
+        self.history = None
+        self.aggregates = None
+        self.source_snapshots = {}
+        self.last_processed_date = None
+        self.next_poll = {}
+
+        # 调度线程与后台压缩线程共享历史数据，写入时需持有该锁
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.reload_event = threading.Event()
+        self.health_server = None
+
+        self.started_at = time.time()
+        self.metrics = {
+            'runs_total': 0,
+            'runs_failed': 0,
+            'last_run_at': None,
+            'last_run_seconds': None,
+            'last_success_at': None,
+            'last_compact_at': None,
+            'source_polls': {source: 0 for source in MemeCollector.SOURCES},
+            'source_last_poll_at': {},
+            'source_last_count': {},
+            'source_failures': {source: 0 for source in MemeCollector.SOURCES},
+            'source_last_error': {},
+        }
+
+    def load_history(self):
+        """从磁盘加载历史数据和趋势聚合到内存"""
+        history_file = os.path.join(self.data_dir, "meme_data_history.csv")
+        if os.path.exists(history_file):
+            self.history = HistoryFrame.load(history_file)
+        else:
+            self.history = None
+        report = HistoryFrame.memory_report(self.history)
+        logger.info(f"常驻模式已加载历史数据 {report['rows']} 条，占用内存 {report['total_bytes']} 字节")
+
+        self.aggregates = TrendAggregates(self.data_dir)
+        if not (self.aggregates.load() and self.aggregates.is_fresh(history_file)):
+            self.aggregates.rebuild(self.history)
+            self.aggregates.save(history_file)
+
+    def schedule_all_now(self):
+        """将所有来源安排为立即轮询"""
+        now = time.monotonic()
+        self.next_poll = {source: now for source in MemeCollector.SOURCES}
+
+    def reload(self):
+        """重新从磁盘读取历史数据，并立即轮询所有来源"""
+        logger.info("收到重载信号，重新加载历史数据")
+        self.reload_event.clear()
+        with self.lock:
+            self.load_history()
+        self.schedule_all_now()
+
+    def poll_sources(self, sources):
+        """轮询到期的来源并更新各来源的最新快照，返回(数据发生变化的来源, 抓取失败的来源)；
+        失败的来源保留上一次的快照"""
+        changed, failed = [], []
+        for source in sources:
+            interval = Config.SOURCE_POLL_INTERVALS.get(source, 600)
+            self.next_poll[source] = time.monotonic() + interval
+
+            self.metrics['source_polls'][source] = self.metrics['source_polls'].get(source, 0) + 1
+            self.metrics['source_last_poll_at'][source] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            try:
+                snapshot = self.collector.collect_source(source, skip_unchanged=source in self.source_snapshots)
+            except RuntimeError as e:
+                self.metrics['source_failures'][source] = self.metrics['source_failures'].get(source, 0) + 1
+                self.metrics['source_last_error'][source] = str(e)
+                failed.append(source)
+                logger.warning(f"{e}，沿用上次结果")
+                continue
+            if snapshot is None:
+                logger.info(f"来源 {source} 原始数据未变化，沿用上次结果")
+                continue
+
+            self.source_snapshots[source] = snapshot
+            self.metrics['source_last_count'][source] = len(snapshot)
+            changed.append(source)
+            logger.info(f"来源 {source} 轮询完成，获取 {len(snapshot)} 条数据")
+        return changed, failed
+
+    def run_cycle(self, sources):
+        """执行一轮：轮询到期来源，再基于所有来源的最新快照处理、存储和转换"""
+        started = time.monotonic()
+        self.metrics['runs_total'] += 1
+        self.metrics['last_run_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        try:
+            changed, failed = self.poll_sources(sources)
+
+            # 每次轮询都更新突增检测，使快速上升的梗在本轮就能体现在热榜上
+            if changed:
+                samples = {}
+                for source in changed:
+                    for item in self.source_snapshots.get(source, []):
+                        samples.setdefault(item['name'], self.processor.standardize_heat_value(item['heat']))
+                rising = self.spike_detector.observe(samples)
+                self.metrics['rising_fast'] = len(rising)
+
+            # 没有来源产生新数据时不重新处理：抓取失败时沿用的旧快照不能覆盖今天的数据；
+            # 来源确认未变化时，只在跨天后处理一次，使新的一天也有记录
+            today = datetime.now().strftime('%Y-%m-%d')
+            if not changed and (failed or self.last_processed_date == today):
+                if failed:
+                    self.metrics['runs_failed'] += 1
+                    return False
+                return True
+
+            raw_data = [item for snapshot in self.source_snapshots.values() for item in snapshot]
+            if not raw_data:
+                logger.warning("本轮没有采集到数据，跳过处理")
+                return False
+
+            with self.lock:
+                self.processor.prepare_run(raw_data)
+                self.processor.load_previous_data(history=self.history)
+                processed_data = self.processor.process_data()
+
+                storage = MemeStorage(processed_data, data_dir=self.data_dir)
+                if not (storage.save_to_csv()
+                        and storage.update_history_file(history_data=self.history, aggregates=self.aggregates)):
+                    raise RuntimeError("数据存储过程出现错误")
+                self.history = storage.history_data
+                self.last_processed_date = self.processor.today
+
+                # 快速上升的梗取最近几次轮询的结果，直接使用常驻的检测器
+                rising_fast = {item['name'] for item in self.spike_detector.rising_fast()}
+                if not self.converter.convert_and_save_js(df=self.history, aggregates=self.aggregates,
+                                                          rising_fast=rising_fast):
+                    logger.warning("JS模块转换失败，但数据管道主要流程已完成")
+
+            self.metrics['last_success_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            return True
+
+        except Exception as e:
+            self.metrics['runs_failed'] += 1
+            logger.error(f"常驻模式本轮运行失败: {e}")
+            return False
+        finally:
+            self.metrics['last_run_seconds'] = round(time.monotonic() - started, 3)
+
+    def compaction_loop(self):
+        """后台线程：按间隔执行历史数据保留策略压缩"""
+        while not self.stop_event.wait(Config.RETENTION_COMPACT_INTERVAL):
+            self.compact()
+
+    def compact(self):
+        """压缩历史数据并替换内存中的历史，同时更新jieba领域词典"""
+        try:
+            with self.lock:
+                history = self.retention.compact(history=self.history, aggregates=self.aggregates)
+                if history is not None:
+                    self.history = history
+                    self.keyword_extractor.update(history['梗的名称'].unique())
+            self.metrics['last_compact_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        except Exception as e:
+            logger.error(f"历史数据压缩失败: {e}")
+
+    def snapshot_metrics(self):
+        """汇总当前运行指标"""
+        metrics = dict(self.metrics)
+        metrics.update({
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'history_rows': 0 if self.history is None else len(self.history),
+            'history_memory': HistoryFrame.memory_report(self.history),
+            'meme_cache_size': len(self.collector.meme_cache),
+            'explanation_cache_size': len(self.processor.explanation_cache),
+        })
+        return metrics
+
+    def start_health_server(self):
+        """在后台线程中启动本地健康检查与指标接口"""
+        daemon = self
+
+        class HealthHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/health':
+                    status = 'stopping' if daemon.stop_event.is_set() else 'ok'
+                    body = {'status': status, 'uptime_seconds': round(time.time() - daemon.started_at, 1)}
+                elif self.path == '/metrics':
+                    body = daemon.snapshot_metrics()
+                else:
+                    self.send_error(404)
+                    return
+
+                payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                # 健康检查请求不写入管道日志
+                pass
+
+        try:
+            self.health_server = ThreadingHTTPServer((self.health_host, self.health_port), HealthHandler)
+        except OSError as e:
+            logger.warning(f"健康检查接口启动失败: {e}")
+            return False
+
+        thread = threading.Thread(target=self.health_server.serve_forever, daemon=True)
+        thread.start()
+        logger.info(f"健康检查接口: http://{self.health_host}:{self.health_port}/health")
+        return True
+
+    def install_signal_handlers(self):
+        """SIGINT/SIGTERM优雅退出，SIGHUP重载"""
+        def handle_stop(signum, frame):
+            logger.info(f"收到信号 {signum}，当前轮次结束后退出")
+            self.stop_event.set()
+
+        def handle_reload(signum, frame):
+            self.reload_event.set()
+
+        signal.signal(signal.SIGINT, handle_stop)
+        signal.signal(signal.SIGTERM, handle_stop)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, handle_reload)
+
+    def run_forever(self):
+        """调度主循环，直到收到退出信号"""
+        logger.info("常驻模式启动")
+        self.install_signal_handlers()
+        self.start_health_server()
+        self.load_history()
+        self.schedule_all_now()
+        self.compact()
+        threading.Thread(target=self.compaction_loop, daemon=True).start()
+
+        try:
+            while not self.stop_event.is_set():
+                if self.reload_event.is_set():
+                    self.reload()
+
+                now = time.monotonic()
+                due = [source for source, at in self.next_poll.items() if at <= now]
+                if due:
+                    self.run_cycle(due)
+
+                # 最多等待1秒，以便及时响应重载信号
+                wait = min(self.next_poll.values()) - time.monotonic()
+                self.stop_event.wait(max(0, min(wait, 1.0)))
+        finally:
+            if self.health_server:
+                self.health_server.shutdown()
+                self.health_server.server_close()
+            self.collector.session.close()
+            if self.collector.archive:
+                self.collector.archive.close()
+            self.spike_detector.close()
+            logger.info("常驻模式已退出")
+
+        return True
@@ -3,15 +3,18 @@
 数据转换器：将CSV数据转换为小程序可用的JSON格式
 """
 
-import pandas as pd
 import json
 import os
 from datetime import datetime, timedelta
 from config import Config
+from aggregates import TrendAggregates
+from history_frame import HistoryFrame
+from shards import ShardWriter
+from spikes import SpikeDetector
 
 class DataConverter:
-    def __init__(self):
-        self.data_dir = Config.DATA_DIR
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir if data_dir else Config.DATA_DIR
         self.output_dir = "../data"  # 小程序的data目录
         
         # 确保输出目录存在
@@ -23,7 +26,7 @@ class DataConverter:
         try:
             # 读取历史数据文件
             history_file = os.path.join(self.data_dir, "meme_data_history.csv")
-            df = pd.read_csv(history_file)
+            df = HistoryFrame.load(history_file)
             
             print(f"✅ 成功加载 {len(df)} 条历史记录")
             return df
@@ -32,24 +35,49 @@ class DataConverter:
             print(f"❌ 加载数据失败: {e}")
             return None
     
-    def generate_hot_list(self, df):
-        """生成热榜数据"""
+    def load_aggregates(self, df=None):
+        """加载趋势聚合，缺失或与历史文件不一致时从历史数据重建"""
+        history_file = os.path.join(self.data_dir, "meme_data_history.csv")
+        aggregates = TrendAggregates(self.data_dir)
+        if aggregates.load() and aggregates.is_fresh(history_file):
+            return aggregates
+        
+        print("趋势聚合缺失或已过期，从历史数据重建")
+        if df is None:
+            df = self.load_latest_data()
+            if df is None:
+                return None
+        aggregates.rebuild(df)
+        aggregates.save(history_file)
+        return aggregates
+    
+    def load_rising_fast(self):
+        """读取突增检测判定为快速上升的梗"""
         try:
-            # 获取最新日期的数据
-            latest_date = df['更新日期'].max()
-            latest_data = df[df['更新日期'] == latest_date].copy()
-            
-            # 按热度排序
-            latest_data = latest_data.sort_values('热度', ascending=False)
+            detector = SpikeDetector(self.data_dir)
+            names = {item['name'] for item in detector.rising_fast()}
+            detector.close()
+            return names
+        except Exception as e:
+            print(f"❌ 读取突增数据失败: {e}")
+            return set()
+    
+    def generate_hot_list(self, aggregates, limit=10, rising_fast=None):
+        """生成热榜数据，limit为None时返回最新一天的全部数据"""
+        rising_fast = rising_fast if rising_fast is not None else set()
+        try:
+            # 最新日期的数据按热度排序
+            latest_data = sorted(aggregates.latest_rows, key=lambda row: row['热度'] or 0, reverse=True)
             
             hot_list = []
-            for _, row in latest_data.head(10).iterrows():  # 取前10个
+            for row in latest_data[:limit]:  # 默认取前10个
                 hot_list.append({
                     'name': row['梗的名称'],
                     'desc': row['梗的简单解释'],
                     'heat': self.format_heat(row['热度']),
-                    'trend': int(row['环比昨天热度变化']) if pd.notna(row['环比昨天热度变化']) else 0,
-                    'source': row['梗的来源'] if '梗的来源' in row else '未知'
+                    'trend': int(row['环比昨天热度变化']) if row.get('环比昨天热度变化') is not None else 0,
+                    'source': row.get('梗的来源') or '未知',
+                    'rising_fast': row['梗的名称'] in rising_fast
                 })
             
             print(f"✅ 生成热榜数据 {len(hot_list)} 条")
@@ -59,15 +87,14 @@ class DataConverter:
             print(f"❌ 生成热榜数据失败: {e}")
             return []
     
-    def generate_chart_data(self, df):
+    def generate_chart_data(self, aggregates):
         """生成图表数据"""
         try:
             # 获取最近7天的数据
-            recent_dates = df['更新日期'].unique()
-            recent_dates = sorted(recent_dates)[-7:]  # 最近7天
+            recent_dates = aggregates.recent_dates(7)
             
-            # 选择热度最高的3个梗进行趋势分析
-            top_memes = df.groupby('梗的名称')['热度'].max().sort_values(ascending=False).head(3).index.tolist()
+            # 选择最近7天热度最高的3个梗进行趋势分析
+            top_memes = [item['name'] for item in aggregates.top(7, 3)]
             
             # 生成日期标签
             date_labels = []
@@ -85,10 +112,9 @@ class DataConverter:
             for i, meme in enumerate(top_memes):
                 meme_data = []
                 for date in recent_dates:
-                    day_data = df[(df['更新日期'] == date) & (df['梗的名称'] == meme)]
-                    if not day_data.empty:
+                    heat = aggregates.heat_on(meme, date)
+                    if heat is not None:
                         # 将热度值标准化到0-100范围
-                        heat = day_data.iloc[0]['热度']
                         normalized_heat = min(100, max(0, heat / 10000))  # 简单的标准化
                         meme_data.append(round(normalized_heat, 1))
                     else:
@@ -128,6 +154,28 @@ class DataConverter:
             print(f"❌ 生成图表数据失败: {e}")
             return {'dates': [], 'series': []}
     
+    def generate_update_info(self, aggregates):
+        """生成更新信息"""
+        return {
+            'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'data_count': aggregates.total_rows,
+            'latest_date': aggregates.last_date or 'N/A'
+        }
+    
+    def save_shards(self, aggregates, df=None, rising_fast=None, replayed_date=None):
+        """增量生成分片数据：梗详情、分页热榜和搜索索引"""
+        try:
+            writer = ShardWriter(self.output_dir, self.data_dir)
+            if df is None:
+                df = self.load_latest_data()
+            writer.update(df, replayed_date=replayed_date)
+            total_pages = writer.write_hot_pages(self.generate_hot_list(aggregates, limit=None, rising_fast=rising_fast))
+            print(f"✅ 保存分片数据: {writer.output_dir}（热榜 {total_pages} 页）")
+            return True
+        except Exception as e:
+            print(f"❌ 保存分片数据失败: {e}")
+            return False
+    
     def format_heat(self, heat_value):
         """格式化热度值"""
         try:
@@ -159,28 +207,28 @@ class DataConverter:
             print(f"❌ 保存JS模块失败: {e}")
             return False
     
-    def convert_and_save_js(self):
-        """转换数据并保存为JS模块文件"""
+    def convert_and_save_js(self, df=None, aggregates=None, rising_fast=None, replayed_date=None):
+        """转换数据并保存为JS模块文件，传入df/aggregates/rising_fast时直接使用内存中的数据，
+        replayed_date为本次重新处理的日期"""
         print("开始数据转换为JS模块...")
         
-        # 加载数据
-        df = self.load_latest_data()
-        if df is None:
+        # 加载趋势聚合（仅在缺失或过期时才需要读取完整历史）
+        if aggregates is None:
+            aggregates = self.load_aggregates(df)
+        if aggregates is None:
             print("❌ 无法加载数据，转换失败")
             return False
         
         # 生成热榜数据
-        hot_list = self.generate_hot_list(df)
+        if rising_fast is None:
+            rising_fast = self.load_rising_fast()
+        hot_list = self.generate_hot_list(aggregates, rising_fast=rising_fast)
         
         # 生成图表数据
-        chart_data = self.generate_chart_data(df)
+        chart_data = self.generate_chart_data(aggregates)
         
         # 生成更新信息
-        update_info = {
-            'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'data_count': len(df),
-            'latest_date': df['更新日期'].max() if not df.empty else 'N/A'
-        }
+        update_info = self.generate_update_info(aggregates)
         
         # 保存为JS模块文件
         try:
@@ -198,6 +246,9 @@ class DataConverter:
             if self.save_as_js_module(update_info, "update_info.js"):
                 success_count += 1
             
+            # 分片数据失败不影响主要数据文件
+            self.save_shards(aggregates, df, rising_fast, replayed_date)
+            
             if success_count == 3:
                 print(f"✅ JS模块转换完成！")
                 print(f"   热榜数据: {os.path.join(self.output_dir, 'hot_list.js')}")
@@ -216,17 +267,18 @@ class DataConverter:
         """转换数据并保存为JSON"""
         print("开始数据转换...")
         
-        # 加载数据
-        df = self.load_latest_data()
-        if df is None:
+        # 加载趋势聚合
+        aggregates = self.load_aggregates()
+        if aggregates is None:
             print("❌ 无法加载数据，使用默认数据")
             return False
         
         # 生成热榜数据
-        hot_list = self.generate_hot_list(df)
+        rising_fast = self.load_rising_fast()
+        hot_list = self.generate_hot_list(aggregates, rising_fast=rising_fast)
         
         # 生成图表数据
-        chart_data = self.generate_chart_data(df)
+        chart_data = self.generate_chart_data(aggregates)
         
         # 保存数据
         try:
@@ -241,16 +293,15 @@ class DataConverter:
                 json.dump(chart_data, f, ensure_ascii=False, indent=2)
             
             # 保存更新时间
-            update_info = {
-                'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'data_count': len(df),
-                'latest_date': df['更新日期'].max() if not df.empty else 'N/A'
-            }
+            update_info = self.generate_update_info(aggregates)
             
             update_file = os.path.join(self.output_dir, "update_info.json")
             with open(update_file, 'w', encoding='utf-8') as f:
                 json.dump(update_info, f, ensure_ascii=False, indent=2)
             
+            # 分片数据失败不影响主要数据文件
+            self.save_shards(aggregates, rising_fast=rising_fast)
+            
             print(f"✅ 数据转换完成！")
             print(f"   热榜数据: {hot_list_file}")
             print(f"   图表数据: {chart_data_file}")
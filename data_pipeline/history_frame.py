@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+历史数据的紧凑内存表示：梗的名称、来源、解释使用分类类型（每个取值只存一份），
+更新日期为真正的日期类型，便于常驻进程长期持有多年历史。
+热度保持float64：微博热度超过float32的精确范围（2^24），历史文件由内存数据重写，不能降低精度
+"""
+
+import os
+import sys
+
+import pandas as pd
+
+from config import Config
+
+DATE_FORMAT = '%Y-%m-%d'
+CATEGORY_COLUMNS = ['梗的名称', '梗的来源', '梗的简单解释']
+NUMERIC_COLUMNS = ['热度', '环比昨天热度变化']
+
+
+class HistoryFrame:
+    @staticmethod
+    def compact(df):
+        """将历史数据转换为紧凑类型，已是紧凑类型的列保持不变"""
+        if df is None:
+            return None
+
+        df = df.copy()
+        if '更新日期' in df and not pd.api.types.is_datetime64_any_dtype(df['更新日期']):
+            df['更新日期'] = pd.to_datetime(df['更新日期'], format=DATE_FORMAT)
+
+        for column in CATEGORY_COLUMNS:
+            if column in df and not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype('category')
+
+        for column in NUMERIC_COLUMNS:
+            if column in df and df[column].dtype != 'float64':
+                df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+
+        return df.reset_index(drop=True)
+
+    @classmethod
+    def load(cls, file_path):
+        """读取历史CSV并转换为紧凑类型"""
+        df = pd.read_csv(
+            file_path,
+            dtype={column: 'category' for column in CATEGORY_COLUMNS},
+            parse_dates=['更新日期'],
+            date_format=DATE_FORMAT,
+        )
+        return cls.compact(df)
+
+    @staticmethod
+    def date_strings(series):
+        """将更新日期列统一为'YYYY-MM-DD'字符串"""
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series.dt.strftime(DATE_FORMAT)
+        return series.astype(str)
+
+    @staticmethod
+    def memory_report(df):
+        """按列统计内存占用（字节）"""
+        if df is None:
+            return {'rows': 0, 'total_bytes': 0, 'columns': {}}
+
+        usage = df.memory_usage(deep=True, index=True)
+        return {
+            'rows': len(df),
+            'total_bytes': int(usage.sum()),
+            'columns': {
+                column: {'dtype': str(df[column].dtype), 'bytes': int(usage[column])}
+                for column in df.columns
+            },
+        }
+
+
+def main():
+    """打印历史数据转换前后的内存占用"""
+    file_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(Config.DATA_DIR, "meme_data_history.csv")
+
+    plain = HistoryFrame.memory_report(pd.read_csv(file_path))
+    compact = HistoryFrame.memory_report(HistoryFrame.load(file_path))
+
+    print(f"历史数据: {file_path}（{compact['rows']} 条）")
+    for column, info in compact['columns'].items():
+        before = plain['columns'].get(column, {}).get('bytes', 0)
+        print(f"  {column}: {before} -> {info['bytes']} 字节 ({info['dtype']})")
+    print(f"  合计: {plain['total_bytes']} -> {compact['total_bytes']} 字节")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+jieba关键词提取（LLM不可用时的解释兜底）：基于历史梗名称构建领域词典和IDF表，
+jieba只初始化一次，批量提取时复用同一份词典。
+领域词只由默认词典切分出的相邻词拼接而成，并检查不会让已有梗名称的切分变差
+"""
+
+import copy
+import math
+import os
+import re
+import sys
+from collections import Counter
+
+import jieba
+import jieba.analyse
+
+from config import Config
+
+TERM_PATTERN = re.compile(r'[一-鿿A-Za-z0-9]+')
+CJK_PATTERN = re.compile(r'[一-鿿]')
+
+_DEFAULT_IDF = None
+_DEFAULT_TOKENIZER = None
+
+
+def _stop_words():
+    """jieba.analyse自带的停用词加上中文虚词"""
+    return set(jieba.analyse.default_tfidf.STOP_WORDS) | set(Config.JIEBA_STOP_WORDS)
+
+
+def _default_tokenizer():
+    """只使用jieba默认词典的分词器，挖掘领域词和检查切分时作为基准"""
+    global _DEFAULT_TOKENIZER
+    if _DEFAULT_TOKENIZER is None:
+        _DEFAULT_TOKENIZER = jieba.Tokenizer()
+        _DEFAULT_TOKENIZER.initialize()
+    return _DEFAULT_TOKENIZER
+
+
+def _read_idf(idf_path):
+    idf_freq = {}
+    if idf_path and os.path.exists(idf_path):
+        with open(idf_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                word, _, idf = line.rstrip('\n').rpartition(' ')
+                if word:
+                    idf_freq[word] = float(idf)
+    return idf_freq
+
+
+def _load_dictionaries(userdict_path, idf_path):
+    """在当前进程中加载jieba及领域词典。
+    领域IDF文件只包含领域词，合并到jieba默认IDF表的副本上，重建后再次调用即可生效
+    （jieba.analyse.set_idf_path在路径不变时不会重新读取文件）"""
+    global _DEFAULT_IDF
+    jieba.initialize()
+    if userdict_path and os.path.exists(userdict_path):
+        jieba.load_userdict(userdict_path)
+
+    tfidf = jieba.analyse.default_tfidf
+    if _DEFAULT_IDF is None:
+        _DEFAULT_IDF = tfidf.idf_freq
+    idf_freq = dict(_DEFAULT_IDF)
+    idf_freq.update(_read_idf(idf_path))
+    tfidf.idf_freq = idf_freq
+    tfidf.stop_words = _stop_words()
+
+
+class KeywordExtractor:
+    USERDICT_FILENAME = "jieba_userdict.txt"
+    IDF_FILENAME = "jieba_idf.txt"
+    NAMES_FILENAME = "jieba_names.txt"
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir if data_dir else Config.DATA_DIR
+        self.userdict_path = os.path.join(self.data_dir, self.USERDICT_FILENAME)
+        self.idf_path = os.path.join(self.data_dir, self.IDF_FILENAME)
+        self.names_path = os.path.join(self.data_dir, self.NAMES_FILENAME)
+        self.vocabulary = None
+        self.initialized = False
+
+    # ---------- 词典 ----------
+
+    @staticmethod
+    def token_runs(name):
+        """用默认词典切分梗名称，按空格、标点断开，返回连续的词序列"""
+        runs, run = [], []
+        for token in _default_tokenizer().lcut(name, HMM=False):
+            if TERM_PATTERN.fullmatch(token):
+                run.append(token)
+            elif run:
+                runs.append(run)
+                run = []
+        if run:
+            runs.append(run)
+        return runs
+
+    @staticmethod
+    def mine_terms(names):
+        """从梗名称中挖掘领域词：较短的完整梗名，以及在多个梗名中反复出现的相邻词组合。
+        候选词只由默认切分的相邻词拼接，不含停用词，且至少包含一个汉字；
+        返回{领域词: 包含该词的梗名称数}"""
+        stop_words = _stop_words()
+        max_tokens = Config.JIEBA_MAX_MERGE_TOKENS
+        max_length = Config.JIEBA_MAX_PHRASE_LENGTH
+
+        counts = Counter()
+        extensions = {}
+        whole = set()
+        for name in names:
+            candidates = set()
+            for run in KeywordExtractor.token_runs(name):
+                spans = {}
+                for i in range(len(run)):
+                    for j in range(i + 2, min(len(run), i + max_tokens) + 1):
+                        tokens = run[i:j]
+                        if any(token.lower() in stop_words for token in tokens):
+                            break
+                        term = ''.join(tokens)
+                        if len(term) > max_length:
+                            break
+                        if CJK_PATTERN.search(term):
+                            spans[(i, j)] = term
+
+                for (i, j), term in spans.items():
+                    candidates.add(term)
+                    # 向左、向右各多拼接一个词得到的候选，用于闭合检查
+                    for outer in ((i - 1, j), (i, j + 1)):
+                        if outer in spans:
+                            extensions.setdefault(term, set()).add(spans[outer])
+                    if i == 0 and j == len(run) and len(term) <= Config.JIEBA_MAX_TERM_LENGTH:
+                        whole.add(term)
+            # 按梗名称计数，同一名称内重复出现只算一次
+            counts.update(candidates)
+
+        # 只保留“闭合”的组合：多拼接一个词后仍出现在同样多的梗名称中时，说明它只是更长短语的一部分
+        min_names = Config.JIEBA_MIN_TERM_NAMES
+        recurring = {
+            term for term, count in counts.items()
+            if count >= min_names
+            and not any(counts[other] == count for other in extensions.get(term, ()))
+        }
+
+        return {term: counts[term] for term in whole | recurring}
+
+    @staticmethod
+    def check_terms(names, terms):
+        """检查领域词是否让梗名称的切分变差：加入领域词后切出的每个词都必须落在默认切分的边界上。
+        返回{梗名称: 跨越默认切分边界的领域词}"""
+        default = _default_tokenizer()
+        domain = jieba.Tokenizer()
+        domain.initialize()
+        for term in terms:
+            domain.add_word(term)
+
+        problems = {}
+        for name in names:
+            boundaries = {0}
+            position = 0
+            for token in default.lcut(name, HMM=False):
+                position += len(token)
+                boundaries.add(position)
+
+            position = 0
+            crossing = []
+            for token in domain.lcut(name, HMM=False):
+                start, position = position, position + len(token)
+                if token in terms and (start not in boundaries or position not in boundaries):
+                    crossing.append(token)
+            if crossing:
+                problems[name] = crossing
+        return problems
+
+    def build(self, names):
+        """根据梗名称重建用户词典和IDF表"""
+        names = sorted({str(name) for name in names if isinstance(name, str) and name})
+        if not names:
+            return False
+
+        terms = self.mine_terms(names)
+
+        # 在其他梗名称中跨越默认切分边界的领域词会把正常的词切碎，不收入词典
+        problems = self.check_terms(names, terms)
+        for crossing in problems.values():
+            for term in crossing:
+                terms.pop(term, None)
+        if problems:
+            print(f"jieba领域词典：{len(problems)} 个梗名称的切分会变差，已剔除相关领域词")
+
+        # 领域词的IDF：默认IDF中位数加上其在梗名称中的稀有度，使领域词优先于通用词；
+        # 文件中只保存领域词，加载时合并到默认IDF表
+        median_idf = jieba.analyse.default_tfidf.median_idf
+        total = len(names)
+        idf_freq = {term: median_idf + math.log(total / max(df, 1)) for term, df in terms.items()}
+
+        try:
+            os.makedirs(self.data_dir, exist_ok=True)
+            for path, lines in (
+                (self.userdict_path, sorted(terms)),
+                (self.idf_path, (f"{word} {idf}" for word, idf in idf_freq.items())),
+                (self.names_path, names),
+            ):
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+                os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"保存jieba领域词典失败: {e}")
+            return False
+
+        self.vocabulary = set(names)
+        print(f"✅ jieba领域词典已更新：{len(terms)} 个词条，来自 {total} 个梗名称")
+
+        # 已初始化的jieba需要重新加载词典
+        if self.initialized:
+            self.initialized = False
+            self.initialize()
+        return True
+
+    def load_vocabulary(self):
+        """读取构建词典时使用的梗名称"""
+        if self.vocabulary is None:
+            self.vocabulary = set()
+            if os.path.exists(self.names_path):
+                with open(self.names_path, 'r', encoding='utf-8') as f:
+                    self.vocabulary = {line.rstrip('\n') for line in f if line.strip()}
+        return self.vocabulary
+
+    def update(self, names):
+        """出现新梗名称时才重建词典"""
+        names = {name for name in names if isinstance(name, str) and name}
+        if names - self.load_vocabulary():
+            return self.build(names | self.vocabulary)
+        return False
+
+    # ---------- 提取 ----------
+
+    def initialize(self):
+        """在当前进程中加载jieba及领域词典（只执行一次）"""
+        if not self.initialized:
+            _load_dictionaries(self.userdict_path, self.idf_path)
+            self.initialized = True
+
+    def extract(self, name, top_k=2):
+        """提取单个梗名称的关键词"""
+        self.initialize()
+        return jieba.analyse.extract_tags(name, topK=top_k)
+
+    def extract_batch(self, names, top_k=2):
+        """批量提取关键词，返回{梗名称: 关键词列表}"""
+        self.initialize()
+        return {name: jieba.analyse.extract_tags(name, topK=top_k) for name in dict.fromkeys(names)}
+
+    def compare(self, names, top_k=2):
+        """对比默认词典与领域词典提取的关键词，返回[(梗名称, 默认关键词, 领域关键词, 是否变差)]；
+        领域关键词中出现跨越默认切分边界的片段或停用词时视为变差"""
+        default = copy.copy(jieba.analyse.default_tfidf)
+        default.tokenizer = _default_tokenizer()
+        default.idf_freq = _DEFAULT_IDF if _DEFAULT_IDF is not None else jieba.analyse.default_tfidf.idf_freq
+        default.stop_words = jieba.analyse.default_tfidf.STOP_WORDS
+
+        domain = self.extract_batch(names, top_k)
+        stop_words = _stop_words()
+        rows = []
+        for name in names:
+            boundaries = {0}
+            position = 0
+            for token in _default_tokenizer().lcut(name, HMM=False):
+                position += len(token)
+                boundaries.add(position)
+
+            worse = False
+            for keyword in domain[name]:
+                start = name.find(keyword)
+                if keyword in stop_words or start not in boundaries or start + len(keyword) not in boundaries:
+                    worse = True
+            rows.append((name, default.extract_tags(name, topK=top_k), domain[name], worse))
+        return rows
+
+
+def main():
+    """用历史梗名称重建领域词典，并对比默认词典与领域词典提取的关键词；有变差的梗名称时返回非零状态"""
+    import pandas as pd
+
+    file_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(Config.DATA_DIR, "meme_data_history.csv")
+    names = sorted({str(name) for name in pd.read_csv(file_path)['梗的名称'].dropna().unique()})
+
+    extractor = KeywordExtractor(sys.argv[2] if len(sys.argv) > 2 else None)
+    extractor.build(names)
+
+    rows = extractor.compare(names)
+    for name, default, domain, worse in rows:
+        if default != domain:
+            print(f"{'✗' if worse else ' '} {name}: {default} -> {domain}")
+    worse_count = sum(1 for row in rows if row[3])
+    print(f"共 {len(rows)} 个梗名称，关键词变化 {sum(1 for row in rows if row[1] != row[2])} 个，变差 {worse_count} 个")
+    return 1 if worse_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
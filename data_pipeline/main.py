@@ -2,6 +2,11 @@ from collectors import MemeCollector
 from processor import MemeProcessor
 from storage import MemeStorage
 from data_converter import DataConverter
+from retention import HistoryRetention
+from keywords import KeywordExtractor
+from work_queue import QueueCoordinator, JobRunner
+from spikes import SpikeDetector
+from profiling import StageProfiler
 from config import Config
 import os
 import logging
@@ -44,9 +49,13 @@ def setup_logging():
     
     return logger
 
-def run_pipeline(output_dir=None):
-    """运行完整的数据管道"""
+def run_pipeline(output_dir=None, replay_date=None, use_queue=False, profile=False, profile_memory=False):
+    """运行完整的数据管道，指定replay_date时使用归档的原始数据重新处理该日，
+    use_queue时梗判断和解释生成交给工作队列，profile/profile_memory时记录各阶段的CPU和内存分析"""
     logger = setup_logging()
+    profiler = StageProfiler(cpu=profile, memory=profile_memory)
+    if profiler.enabled:
+        logger.info(f"性能分析结果将保存到: {profiler.output_dir}")
     
     try:
         logger.info("开始运行数据管道")
@@ -59,32 +68,95 @@ def run_pipeline(output_dir=None):
         if not os.path.exists(data_dir):
             os.makedirs(data_dir)
         
-        # 1. 数据采集
+        # 已汇总为周/月数据的日期不能重新处理：写入历史后会被保留策略直接丢弃
+        if replay_date and HistoryRetention(data_dir).is_rolled_up(replay_date):
+            logger.error(f"{replay_date} 的明细已汇总为周/月数据，无法重新处理")
+            return False
+        
+        # 1. 数据采集（梗判断延迟到下一阶段统一进行）
         logger.info("开始数据采集")
-        collector = MemeCollector()
-        raw_data = collector.run_all_collectors()
+        with profiler.stage('collect'):
+            collector = MemeCollector()
+            collector.defer_classification = True
+            if replay_date:
+                logger.info(f"使用 {replay_date} 的归档原始数据重新处理")
+                raw_data = collector.replay(replay_date)
+            else:
+                raw_data = collector.run_all_collectors()
+        
+        if replay_date and not raw_data:
+            logger.error(f"没有 {replay_date} 的归档原始数据，无法重新处理")
+            return False
+        
+        # 2. 梗判断
+        coordinator = None
+        with profiler.stage('classify'):
+            if use_queue:
+                logger.info(f"通过工作队列判断 {len(collector.pending_classification)} 个候选话题")
+                coordinator = QueueCoordinator(runner=JobRunner(collector=collector))
+                collector.defer_classification = False
+                raw_data = coordinator.classify(collector, raw_data)
+            else:
+                raw_data = collector.classify_pending(raw_data)
+        if not raw_data:
+            logger.error("没有采集到任何梗，跳过本次处理")
+            return False
         logger.info(f"数据采集完成，共获取 {len(raw_data)} 条原始数据")
         
-        # 2. 数据处理
+        # 3. 解释生成
+        with profiler.stage('explain'):
+            keyword_extractor = KeywordExtractor(data_dir)
+            processor = MemeProcessor(raw_data, keyword_extractor=keyword_extractor)
+            processor.prepare_run(raw_data, today=replay_date)
+            if coordinator:
+                coordinator.runner.processor = processor
+                logger.info(f"通过工作队列生成 {coordinator.explain(processor)} 条梗解释")
+            else:
+                logger.info(f"生成 {processor.generate_explanations()} 条梗解释")
+        
+        # 4. 数据处理
         logger.info("开始数据处理")
-        processor = MemeProcessor(raw_data)
-        processor.load_previous_data()
-        processed_data = processor.process_data()
+        with profiler.stage('process'):
+            processor.load_previous_data()
+            processed_data = processor.process_data()
+            
+            # 突增检测只针对实时采集的数据
+            rising_fast = None
+            if not replay_date:
+                detector = SpikeDetector(data_dir)
+                rising = detector.observe(processor.heat_samples())
+                detector.close()
+                rising_fast = set(rising)
+                logger.info(f"突增检测完成，快速上升的梗: {len(rising)} 个")
         logger.info(f"数据处理完成，共处理 {len(processed_data)} 条数据")
         
-        # 3. 数据存储
+        # 5. 数据存储
         logger.info("开始数据存储")
-        storage = MemeStorage(processed_data, data_dir=data_dir)
-        daily_save_result = storage.save_to_csv()
-        history_update_result = storage.update_history_file()
+        with profiler.stage('store'):
+            storage = MemeStorage(processed_data, data_dir=data_dir, today=replay_date)
+            daily_save_result = storage.save_to_csv()
+            history_update_result = storage.update_history_file()
+            
+            if daily_save_result and history_update_result:
+                # 按保留策略压缩历史数据
+                history_data = HistoryRetention(data_dir, archive=collector.archive).compact(
+                    history=storage.history_data, aggregates=storage.aggregates
+                )
+                
+                # 出现新梗名称时更新jieba领域词典，供下次兜底解释使用
+                keyword_extractor.update(history_data['梗的名称'].unique())
         
         if daily_save_result and history_update_result:
             logger.info("数据存储完成")
             
-            # 4. 数据转换为小程序JS模块
+            # 6. 数据转换为小程序JS模块
             logger.info("开始转换数据为小程序JS模块")
-            converter = DataConverter()
-            js_convert_result = converter.convert_and_save_js()
+            with profiler.stage('convert'):
+                converter = DataConverter(data_dir)
+                js_convert_result = converter.convert_and_save_js(
+                    df=history_data, aggregates=storage.aggregates, rising_fast=rising_fast,
+                    replayed_date=replay_date
+                )
             
             if js_convert_result:
                 logger.info("JS模块转换成功")
@@ -102,16 +174,36 @@ def run_pipeline(output_dir=None):
     except Exception as e:
         logger.error(f"数据管道运行失败: {e}")
         return False
+    
+    finally:
+        summary_path = profiler.write_summary()
+        if summary_path:
+            for stage in profiler.stages:
+                peak = f"，内存峰值 {stage['peak_mb']:.2f} MB" if 'peak_mb' in stage else ""
+                logger.info(f"阶段 {stage['stage']} 耗时 {stage['seconds']:.3f} 秒{peak}")
+            logger.info(f"性能分析汇总已保存到: {summary_path}")
 
 def parse_args():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description='热梗数据管道')
     parser.add_argument('--output-dir', type=str, help='输出目录（可选，默认使用config中的配置）')
+    parser.add_argument('--daemon', action='store_true', help='常驻模式：进程内按来源定时轮询，并提供本地健康检查接口')
+    parser.add_argument('--queue', action='store_true', help='队列模式：梗判断和解释生成交给工作进程（python work_queue.py --workers N）')
+    parser.add_argument('--replay-date', type=str, help='使用归档的原始数据重新处理指定日期（YYYY-MM-DD），不重新抓取热搜，梗判断和解释仍会调用LLM')
+    parser.add_argument('--profile', action='store_true', help='用cProfile记录各阶段（采集/梗判断/解释/处理/存储/转换）的函数耗时')
+    parser.add_argument('--profile-memory', action='store_true', help='用tracemalloc记录各阶段新增内存分配最多的代码位置')
     return parser.parse_args()
 
 if __name__ == "__main__":
     args = parse_args()
-    success = run_pipeline(output_dir=args.output_dir)
+    
+    if args.daemon:
+        from daemon import MemeDaemon
+        setup_logging()
+        success = MemeDaemon(data_dir=args.output_dir).run_forever()
+    else:
+        success = run_pipeline(output_dir=args.output_dir, replay_date=args.replay_date, use_queue=args.queue,
+                               profile=args.profile, profile_memory=args.profile_memory)
     
     if success:
         print("data collector success")
@@ -1,22 +1,21 @@
 import pandas as pd
 from datetime import datetime, timedelta
 import re
-import jieba
-import jieba.analyse
 from openai import OpenAI
 from config import Config
+from history_frame import HistoryFrame
+from keywords import KeywordExtractor
 
 class MemeProcessor:
-    def __init__(self, raw_data):
-        self.raw_data = raw_data
-        self.today = datetime.now().strftime("%Y-%m-%d")
-        self.yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-        self.processed_data = None
-        self.previous_data = None
+    def __init__(self, raw_data, openai_client=None, keyword_extractor=None):
+        self.prepare_run(raw_data)
+        self.keyword_extractor = keyword_extractor or KeywordExtractor()
         
         # 初始化OpenAI客户端用于生成解释
-        self.openai_client = None
-        if Config.is_llm_enabled():
+        self.openai_client = openai_client
+        if self.openai_client:
+            print("✅ 已启用LLM梗解释生成功能")
+        elif Config.is_llm_enabled():
             self.openai_client = OpenAI(
                 api_key=Config.get_openai_api_key(),
                 base_url=Config.get_openai_base_url()
@@ -28,10 +27,19 @@ class MemeProcessor:
         # 缓存解释结果，避免重复调用
         self.explanation_cache = {}
     
-    def load_previous_data(self, file_path="meme_data_history.csv"):
-        """加载昨天的数据用于计算环比变化"""
+    def prepare_run(self, raw_data, today=None):
+        """重置单轮处理状态（常驻模式下复用实例时日期可能已跨天，重新处理归档时可指定日期）"""
+        self.raw_data = raw_data
+        current = datetime.strptime(today, "%Y-%m-%d") if today else datetime.now()
+        self.today = current.strftime("%Y-%m-%d")
+        self.yesterday = (current - timedelta(days=1)).strftime("%Y-%m-%d")
+        self.processed_data = None
+        self.previous_data = None
+    
+    def load_previous_data(self, file_path="meme_data_history.csv", history=None):
+        """加载昨天的数据用于计算环比变化，传入history时直接使用内存中的历史数据"""
         try:
-            df = pd.read_csv(file_path)
+            df = history if history is not None else HistoryFrame.load(file_path)
             self.previous_data = df[df['更新日期'] == self.yesterday]
             return len(self.previous_data)
         except Exception as e:
@@ -61,25 +69,44 @@ class MemeProcessor:
         except:
             return 0
     
-    def generate_meme_explanation(self, meme_name):
-        """使用大模型生成梗的简单解释"""
-        # 检查缓存
-        if meme_name in self.explanation_cache:
-            return self.explanation_cache[meme_name]
+    def fallback_explanation(self, meme_name, keywords=None):
+        """LLM不可用时基于jieba关键词生成简化解释"""
+        if keywords is None:
+            keywords = self.keyword_extractor.extract(meme_name, top_k=2)
+        if keywords:
+            explanation = f"与{'、'.join(keywords)}相关的网络流行语"
+        else:
+            explanation = "当下流行的网络热梗"
+        self.explanation_cache[meme_name] = explanation
+        return explanation
+    
+    def prefill_fallback_explanations(self, meme_names):
+        """批量生成简化解释并写入缓存，避免逐个调用jieba"""
+        pending = [name for name in meme_names if name not in self.explanation_cache]
+        if not pending:
+            return 0
         
-        # 如果没有OpenAI客户端，使用简化版本
+        keywords = self.keyword_extractor.extract_batch(pending, top_k=2)
+        for name in pending:
+            self.fallback_explanation(name, keywords.get(name, []))
+        return len(pending)
+    
+    def generate_explanations(self):
+        """为即将入选的梗生成解释，写入缓存"""
+        names = [name for name in self.select_top_memes()['name'] if name not in self.explanation_cache]
         if not self.openai_client:
-            keywords = jieba.analyse.extract_tags(meme_name, topK=2)
-            if keywords:
-                explanation = f"与{'、'.join(keywords)}相关的网络流行语"
-            else:
-                explanation = "当下流行的网络热梗"
-            self.explanation_cache[meme_name] = explanation
-            return explanation
+            self.prefill_fallback_explanations(names)
+        for name in names:
+            self.generate_meme_explanation(name)
+        return len(names)
+    
+    def explain_with_llm(self, meme_name):
+        """调用大模型生成解释，失败时抛出异常（不使用备用方案，也不写入缓存）"""
+        if not self.openai_client:
+            raise RuntimeError("LLM不可用")
         
-        try:
-            # 构建prompt
-            prompt = f"""
+        # 构建prompt
+        prompt = f"""
 请为网络梗"{meme_name}"生成一个简洁的解释（不超过20个字）。
 
 要求：
@@ -90,18 +117,31 @@ class MemeProcessor:
 
 只返回解释内容，不要其他说明。
 """
-            
-            response = self.openai_client.chat.completions.create(
-                model=Config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "你是一个专门解释网络梗的助手，能够用简洁的语言解释各种网络流行语的含义。"},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.5
-            )
-            
-            explanation = response.choices[0].message.content.strip()
+        
+        response = self.openai_client.chat.completions.create(
+            model=Config.OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": "你是一个专门解释网络梗的助手，能够用简洁的语言解释各种网络流行语的含义。"},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=200,
+            temperature=0.5
+        )
+        
+        return response.choices[0].message.content.strip()
+    
+    def generate_meme_explanation(self, meme_name):
+        """使用大模型生成梗的简单解释"""
+        # 检查缓存
+        if meme_name in self.explanation_cache:
+            return self.explanation_cache[meme_name]
+        
+        # 如果没有OpenAI客户端，使用简化版本
+        if not self.openai_client:
+            return self.fallback_explanation(meme_name)
+        
+        try:
+            explanation = self.explain_with_llm(meme_name)
             
             # 缓存结果
             self.explanation_cache[meme_name] = explanation
@@ -110,13 +150,7 @@ class MemeProcessor:
         except Exception as e:
             print(f"LLM生成解释失败 ('{meme_name}'): {e}")
             # 调用失败时使用备用方案
-            keywords = jieba.analyse.extract_tags(meme_name, topK=2)
-            if keywords:
-                explanation = f"与{'、'.join(keywords)}相关的网络流行语"
-            else:
-                explanation = "当下流行的网络热梗"
-            self.explanation_cache[meme_name] = explanation
-            return explanation
+            return self.fallback_explanation(meme_name)
     
     def calculate_heat_change(self, meme_name, current_heat):
         """计算环比昨天的热度变化"""
@@ -137,8 +171,8 @@ class MemeProcessor:
         change_rate = ((current_heat - yesterday_heat) / yesterday_heat) * 100
         return round(change_rate, 1)  # 保留一位小数
     
-    def process_data(self):
-        """处理原始数据为标准格式"""
+    def standardize_raw_data(self):
+        """去重并标准化热度值"""
         # 转换为DataFrame
         df = pd.DataFrame(self.raw_data)
         
@@ -147,9 +181,27 @@ class MemeProcessor:
         
         # 标准化热度值
         df['heat_value'] = df['heat'].apply(self.standardize_heat_value)
+        return df
+    
+    def heat_samples(self):
+        """本轮所有候选话题的标准化热度，供突增检测使用"""
+        df = self.standardize_raw_data()
+        return dict(zip(df['name'], df['heat_value']))
+    
+    def select_top_memes(self):
+        """去重、标准化热度并取热度最高的20个梗"""
+        df = self.standardize_raw_data()
         
         # 按热度排序并取TOP20
-        df = df.sort_values(by='heat_value', ascending=False).head(20)
+        return df.sort_values(by='heat_value', ascending=False).head(20)
+    
+    def process_data(self):
+        """处理原始数据为标准格式"""
+        df = self.select_top_memes()
+        
+        # LLM不可用时批量生成简化解释
+        if not self.openai_client:
+            self.prefill_fallback_explanations(df['name'].tolist())
         
         # 生成标准格式数据
         result_data = []
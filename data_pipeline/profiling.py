@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+分阶段性能分析：按需用cProfile记录每个阶段的函数耗时，用tracemalloc记录内存分配，
+每个阶段在本次运行的日志目录下输出.prof文件和前若干项的文本摘要
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import Config
+
+
+class StageProfiler:
+    def __init__(self, cpu=False, memory=False, log_dir=None):
+        self.cpu = cpu
+        self.memory = memory
+        self.enabled = cpu or memory
+        self.stages = []
+        self.output_dir = None
+        if self.enabled:
+            log_dir = log_dir if log_dir else Config.LOG_DIR
+            run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+            self.output_dir = os.path.join(log_dir, f"{Config.PROFILE_DIR_PREFIX}{run_id}")
+            os.makedirs(self.output_dir, exist_ok=True)
+
+    def _path(self, stage, suffix):
+        index = len(self.stages) + 1
+        return os.path.join(self.output_dir, f"{index:02d}_{stage}{suffix}")
+
+    @contextmanager
+    def stage(self, name):
+        """分析一个阶段；未启用时不做任何事"""
+        if not self.enabled:
+            yield
+            return
+
+        profiler = cProfile.Profile() if self.cpu else None
+        before = None
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+            summary = {'stage': name, 'seconds': elapsed}
+            if profiler:
+                summary['cpu'] = self._write_cpu(name, profiler)
+            if self.memory:
+                summary.update(self._write_memory(name, before))
+            self.stages.append(summary)
+
+    def _write_cpu(self, name, profiler):
+        """输出.prof文件（可用snakeviz等工具查看）以及按累计耗时排序的摘要"""
+        prof_path = self._path(name, '.prof')
+        profiler.dump_stats(prof_path)
+
+        buffer = io.StringIO()
+        stats = pstats.Stats(profiler, stream=buffer)
+        stats.sort_stats('cumulative').print_stats(Config.PROFILE_TOP_N)
+        stats.sort_stats('tottime').print_stats(Config.PROFILE_TOP_N)
+        with open(self._path(name, '_cpu.txt'), 'w', encoding='utf-8') as f:
+            f.write(buffer.getvalue())
+        return prof_path
+
+    def _write_memory(self, name, before):
+        """输出本阶段新增内存分配最多的代码位置"""
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        # 排除分析工具自身的分配
+        ignored = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, pstats.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        )
+        diff = after.filter_traces(ignored).compare_to(before.filter_traces(ignored), 'lineno')
+
+        lines = [
+            f"阶段: {name}",
+            f"当前占用: {current / 1024 / 1024:.2f} MB，阶段峰值: {peak / 1024 / 1024:.2f} MB",
+            f"新增分配最多的前 {Config.PROFILE_TOP_N} 处:",
+        ]
+        for stat in diff[:Config.PROFILE_TOP_N]:
+            lines.append(str(stat))
+        with open(self._path(name, '_memory.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return {'current_mb': current / 1024 / 1024, 'peak_mb': peak / 1024 / 1024}
+
+    def write_summary(self):
+        """输出各阶段耗时和内存峰值的汇总，返回汇总文件路径"""
+        if not self.enabled:
+            return None
+
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        lines = [f"{'阶段':<10}{'耗时(秒)':>12}{'内存峰值(MB)':>16}"]
+        for summary in self.stages:
+            peak = f"{summary['peak_mb']:.2f}" if 'peak_mb' in summary else '-'
+            lines.append(f"{summary['stage']:<10}{summary['seconds']:>12.3f}{peak:>16}")
+        path = os.path.join(self.output_dir, 'summary.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+历史数据保留与压缩：最近一段时间保留逐日明细，更早的数据汇总为周/月粒度
+（热度峰值、上榜天数、来源），并清理与历史文件重复的每日CSV
+"""
+
+import glob
+import json
+import os
+import re
+from datetime import timedelta
+
+import pandas as pd
+
+from archive import PayloadArchive
+from config import Config
+from history_frame import HistoryFrame
+
+ROLLUP_COLUMNS = ['周期', '梗的名称', '热度峰值', '上榜天数', '梗的来源', '梗的简单解释']
+
+
+class HistoryRetention:
+    STATE_FILENAME = "retention_state.json"
+    WEEKLY_FILENAME = "meme_data_weekly.csv"
+    MONTHLY_FILENAME = "meme_data_monthly.csv"
+
+    def __init__(self, data_dir=None, archive=None):
+        self.data_dir = data_dir if data_dir else Config.DATA_DIR
+        self.history_file = os.path.join(self.data_dir, "meme_data_history.csv")
+        self.weekly_file = os.path.join(self.data_dir, self.WEEKLY_FILENAME)
+        self.monthly_file = os.path.join(self.data_dir, self.MONTHLY_FILENAME)
+        self.state_file = os.path.join(self.data_dir, self.STATE_FILENAME)
+
+        # 逐日明细至少覆盖最长的趋势聚合窗口，保证聚合可以从历史重建
+        self.daily_days = max(Config.RETENTION_DAILY_DAYS, max(Config.AGGREGATE_WINDOWS))
+        self.weekly_days = max(Config.RETENTION_WEEKLY_DAYS, self.daily_days)
+        self.monthly_months = Config.RETENTION_MONTHLY_MONTHS
+        self.daily_file_days = Config.RETENTION_DAILY_FILE_DAYS
+        self.archive_days = Config.RETENTION_ARCHIVE_DAYS
+        self.archive = archive
+
+    # ---------- 读写 ----------
+
+    @staticmethod
+    def _read_csv(path, columns):
+        if os.path.exists(path):
+            return pd.read_csv(path)
+        return pd.DataFrame(columns=columns)
+
+    @staticmethod
+    def _write_csv(df, path):
+        """先写临时文件再替换，避免压缩中途失败留下残缺文件"""
+        tmp_path = path + '.tmp'
+        df.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+        os.replace(tmp_path, path)
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _save_state(self, state):
+        tmp_path = self.state_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_file)
+
+    # ---------- 汇总 ----------
+
+    @staticmethod
+    def _join_sources(values):
+        sources = set()
+        for value in values.dropna():
+            sources.update(s for s in str(value).split('、') if s)
+        return '、'.join(sorted(sources))
+
+    @staticmethod
+    def _last_valid(values):
+        values = values.dropna()
+        return values.iloc[-1] if not values.empty else None
+
+    def _merge_rollups(self, frames):
+        """合并同一周期、同一梗的汇总行"""
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+        combined = pd.concat(frames, ignore_index=True)
+        merged = combined.groupby(['周期', '梗的名称'], sort=True, observed=True).agg({
+            '热度峰值': 'max',
+            '上榜天数': 'sum',
+            '梗的来源': self._join_sources,
+            '梗的简单解释': self._last_valid,
+        }).reset_index()
+        return merged[ROLLUP_COLUMNS]
+
+    def rollup_daily(self, df):
+        """将逐日明细汇总为周粒度（周期为该周周一）"""
+        if df.empty:
+            return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+        dates = pd.to_datetime(df['更新日期'])
+        weekly = pd.DataFrame({
+            '周期': (dates - pd.to_timedelta(dates.dt.weekday, unit='D')).dt.strftime('%Y-%m-%d'),
+            '梗的名称': df['梗的名称'].values,
+            '热度峰值': df['热度'].values,
+            '上榜天数': 1,
+            '梗的来源': df['梗的来源'].values if '梗的来源' in df else None,
+            '梗的简单解释': df['梗的简单解释'].values,
+        })
+        return self._merge_rollups([weekly])
+
+    def rollup_weekly(self, df):
+        """将周汇总进一步汇总为月粒度（按周一所在月份归属）"""
+        if df.empty:
+            return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+        monthly = df.copy()
+        monthly['周期'] = monthly['周期'].str.slice(0, 7)
+        return self._merge_rollups([monthly])
+
+    def is_rolled_up(self, date):
+        """某天的逐日明细是否已经汇总进周/月数据（此后不能再按天写入历史）"""
+        rolled_through = self._load_state().get('rolled_through', '')
+        return bool(rolled_through) and date <= rolled_through
+
+    # ---------- 压缩 ----------
+
+    def compact(self, history=None, aggregates=None):
+        """执行一次保留策略压缩，返回压缩后的逐日历史数据"""
+        if history is None:
+            if not os.path.exists(self.history_file):
+                return None
+            history = HistoryFrame.load(self.history_file)
+        if history.empty:
+            return history
+
+        # 以历史中的最新日期为基准，采集中断时不会误删数据
+        latest = pd.to_datetime(history['更新日期']).max()
+        daily_cutoff = (latest - timedelta(days=self.daily_days - 1)).strftime('%Y-%m-%d')
+        weekly_cutoff = (latest - timedelta(days=self.weekly_days - 1)).strftime('%Y-%m-%d')
+
+        expired = history[history['更新日期'] < daily_cutoff]
+        kept = history[history['更新日期'] >= daily_cutoff]
+
+        if not expired.empty:
+            # 水位线之前的日期已经汇总过（上次压缩在写回历史前中断），不能重复累计
+            state = self._load_state()
+            rolled_through = state.get('rolled_through', '')
+            pending = expired[expired['更新日期'] > rolled_through] if rolled_through else expired
+
+            weekly = self._merge_rollups([
+                self._read_csv(self.weekly_file, ROLLUP_COLUMNS),
+                self.rollup_daily(pending),
+            ])
+
+            # 周期开始早于周保留期的周汇总并入月汇总
+            old_weeks = weekly[weekly['周期'] < weekly_cutoff]
+            weekly = weekly[weekly['周期'] >= weekly_cutoff]
+            monthly = self._merge_rollups([
+                self._read_csv(self.monthly_file, ROLLUP_COLUMNS),
+                self.rollup_weekly(old_weeks),
+            ])
+            if self.monthly_months:
+                monthly_cutoff = (latest - pd.DateOffset(months=self.monthly_months)).strftime('%Y-%m')
+                monthly = monthly[monthly['周期'] > monthly_cutoff]
+
+            self._write_csv(weekly, self.weekly_file)
+            self._write_csv(monthly, self.monthly_file)
+            self._save_state({'rolled_through': max(rolled_through, HistoryFrame.date_strings(expired['更新日期']).max())})
+            self._write_csv(kept, self.history_file)
+            print(f"历史数据压缩完成：{expired['更新日期'].nunique()} 天明细已汇总为周/月数据")
+
+            if aggregates is not None:
+                aggregates.total_rows = len(kept)
+                aggregates.save(self.history_file)
+
+        self.remove_daily_files(latest)
+        self.prune_archive(latest)
+        return kept.reset_index(drop=True)
+
+    def remove_daily_files(self, latest):
+        """删除已超出保留期的每日CSV（其内容已包含在历史文件中）"""
+        cutoff = (latest - timedelta(days=self.daily_file_days - 1)).strftime('%Y-%m-%d')
+        removed = 0
+        for path in glob.glob(os.path.join(self.data_dir, "meme_data_*.csv")):
+            match = re.fullmatch(r'meme_data_(\d{4}-\d{2}-\d{2})\.csv', os.path.basename(path))
+            if match and match.group(1) < cutoff:
+                os.remove(path)
+                removed += 1
+        if removed:
+            print(f"已清理 {removed} 个过期的每日数据文件")
+        return removed
+
+    def prune_archive(self, latest):
+        """删除超出保留期的原始数据归档"""
+        if not self.archive_days:
+            return 0
+
+        archive = self.archive
+        if archive is None:
+            if not os.path.exists(os.path.join(Config.ARCHIVE_DIR, PayloadArchive.INDEX_FILENAME)):
+                return 0
+            archive = PayloadArchive()
+
+        try:
+            cutoff = (latest - timedelta(days=self.archive_days - 1)).strftime('%Y-%m-%d')
+            removed = archive.prune(cutoff)
+        finally:
+            if archive is not self.archive:
+                archive.close()
+        if removed:
+            print(f"已清理 {removed} 个过期的原始数据归档文件")
+        return removed
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+小程序分片数据：每个梗一个详情文件（完整热度序列和解释）、分页热榜，
+以及按首字符分桶的前缀/n-gram搜索索引。每次只重写新增或重新处理的日期中出现的梗所涉及的文件
+"""
+
+import hashlib
+import json
+import os
+
+from config import Config
+from history_frame import HistoryFrame
+
+
+class ShardWriter:
+    STATE_FILENAME = "shards_state.json"
+    # 索引格式版本，分桶规则变化时递增，旧状态会被丢弃并从历史重建
+    STATE_VERSION = 3
+
+    def __init__(self, output_dir, data_dir=None):
+        self.output_dir = os.path.join(output_dir, Config.SHARD_DIR_NAME)
+        self.data_dir = data_dir if data_dir else Config.DATA_DIR
+        self.state_file = os.path.join(self.data_dir, self.STATE_FILENAME)
+        self.state = None
+
+    @staticmethod
+    def meme_id(name):
+        """梗名称对应的稳定文件名"""
+        return hashlib.md5(name.encode('utf-8')).hexdigest()[:12]
+
+    @staticmethod
+    def bucket(term):
+        """搜索词所在的分桶，小程序端用 term.charCodeAt(0) % 桶数 计算。
+        charCodeAt返回UTF-16编码单元，emoji等BMP以外的字符取其高位代理项"""
+        code_unit = int.from_bytes(term.encode('utf-16-le')[:2], 'little')
+        return code_unit % Config.SEARCH_INDEX_BUCKETS
+
+    @staticmethod
+    def search_terms(name):
+        """梗名称的前缀和n-gram（小写）"""
+        text = name.lower()
+        prefixes = {text[:n] for n in range(1, min(len(text), Config.SEARCH_MAX_PREFIX) + 1)}
+        grams = {
+            text[i:i + n]
+            for n in Config.SEARCH_NGRAM_SIZES
+            for i in range(len(text) - n + 1)
+            if text[i:i + n].strip()
+        }
+        return prefixes, grams
+
+    # ---------- 读写 ----------
+
+    def _write_json(self, relative_path, data):
+        path = os.path.join(self.output_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def _read_json(self, relative_path):
+        path = os.path.join(self.output_dir, relative_path)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def load_state(self):
+        if self.state is None:
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    self.state = json.load(f)
+            except Exception:
+                self.state = None
+            if self.state is not None and self.state.get('version') != self.STATE_VERSION:
+                self.state = None
+        return self.state
+
+    def save_state(self):
+        tmp_path = self.state_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_file)
+
+    # ---------- 梗详情 ----------
+
+    def update_meme(self, name, points, explanation=None, sources=()):
+        """把新的(日期, 热度)数据点合并进梗详情文件"""
+        meme_id = self.meme_id(name)
+        relative_path = os.path.join('memes', f"{meme_id}.json")
+        detail = self._read_json(relative_path) or {
+            'id': meme_id,
+            'name': name,
+            'desc': None,
+            'sources': [],
+            'series': [],
+        }
+
+        # 重新处理较早的日期时，不用旧的解释覆盖最新的解释
+        previous_last_seen = detail.get('last_seen') or ''
+        series = dict(detail['series'])
+        series.update(points)
+        detail['series'] = sorted(series.items())
+        detail['first_seen'] = detail['series'][0][0]
+        detail['last_seen'] = detail['series'][-1][0]
+        if explanation and max(date for date, _ in points) >= previous_last_seen:
+            detail['desc'] = explanation
+        for source in sources:
+            if source and source not in detail['sources']:
+                detail['sources'].append(source)
+
+        self._write_json(relative_path, detail)
+        return meme_id, detail
+
+    # ---------- 搜索索引 ----------
+
+    def _index_meme(self, meme_id, name, heat, last_seen):
+        """更新梗元数据及其涉及的倒排表，返回需要重写的分桶"""
+        memes = self.state['memes']
+        memes[meme_id] = {'name': name, 'heat': heat, 'last_seen': last_seen}
+
+        dirty = set()
+        prefixes, grams = self.search_terms(name)
+        for kind, terms in (('prefix', prefixes), ('gram', grams)):
+            for term in terms:
+                b = str(self.bucket(term))
+                postings = self.state['postings'].setdefault(b, {'prefix': {}, 'gram': {}})[kind]
+                ids = postings.setdefault(term, [])
+                if meme_id not in ids:
+                    ids.append(meme_id)
+                # 最近上榜、热度高的梗排在前面
+                ids.sort(key=lambda i: (memes[i]['last_seen'], memes[i]['heat']), reverse=True)
+                dirty.add(b)
+        return dirty
+
+    def _write_buckets(self, buckets):
+        """重写指定分桶的搜索索引文件，每个词最多保留SEARCH_MAX_POSTINGS个结果"""
+        memes = self.state['memes']
+        limit = Config.SEARCH_MAX_POSTINGS
+        for b in buckets:
+            content = {
+                kind: {term: [[i, memes[i]['name']] for i in ids[:limit]] for term, ids in postings.items()}
+                for kind, postings in self.state['postings'][b].items()
+            }
+            self._write_json(os.path.join('search', f"{b}.json"), content)
+
+    # ---------- 分页热榜 ----------
+
+    def write_hot_pages(self, hot_list):
+        """将热榜按页写出（附带详情文件id），并清理多余的旧页"""
+        hot_list = [dict(item, id=self.meme_id(item['name'])) for item in hot_list]
+        page_size = Config.HOT_LIST_PAGE_SIZE
+        total_pages = max(1, -(-len(hot_list) // page_size))
+        for page in range(total_pages):
+            self._write_json(os.path.join('hot', f"page_{page + 1}.json"), {
+                'page': page + 1,
+                'total_pages': total_pages,
+                'total': len(hot_list),
+                'items': hot_list[page * page_size:(page + 1) * page_size],
+            })
+
+        page = total_pages + 1
+        while os.path.exists(os.path.join(self.output_dir, 'hot', f"page_{page}.json")):
+            os.remove(os.path.join(self.output_dir, 'hot', f"page_{page}.json"))
+            page += 1
+        return total_pages
+
+    # ---------- 入口 ----------
+
+    def _apply_rows(self, df):
+        """把历史数据中的若干行合并进梗详情，返回需要重写的分桶"""
+        dirty = set()
+        df = df.assign(_date=HistoryFrame.date_strings(df['更新日期'])).sort_values('_date')
+        for name, group in df.groupby('梗的名称', observed=True, sort=False):
+            name = str(name)
+            points = [(date, float(heat)) for date, heat in zip(group['_date'], group['热度'])]
+            explanation = group['梗的简单解释'].dropna().iloc[-1] if group['梗的简单解释'].notna().any() else None
+            sources = [str(source) for source in group['梗的来源'].dropna().unique()] if '梗的来源' in group else []
+            meme_id, detail = self.update_meme(name, points, explanation, sources)
+            last_date, last_heat = detail['series'][-1]
+            dirty |= self._index_meme(meme_id, name, last_heat, last_date)
+        if not df.empty:
+            self.state['last_date'] = max(self.state.get('last_date') or '', df['_date'].max())
+        return dirty
+
+    def bootstrap(self, df):
+        """首次运行时从完整历史生成所有梗的分片"""
+        self.state = {'version': self.STATE_VERSION, 'last_date': None, 'memes': {}, 'postings': {}}
+
+        # 清除旧的索引分桶，避免按旧规则写入的文件残留
+        search_dir = os.path.join(self.output_dir, 'search')
+        if os.path.isdir(search_dir):
+            for filename in os.listdir(search_dir):
+                if filename.endswith('.json'):
+                    os.remove(os.path.join(search_dir, filename))
+
+        if df is None or df.empty:
+            return 0
+
+        self._apply_rows(df)
+        self._write_buckets(set(self.state['postings']))
+        return len(self.state['memes'])
+
+    def update(self, df, replayed_date=None):
+        """增量更新：重新合并上次成功写入之后的所有日期（中途失败的日期会在下次补上），
+        以及重新处理的日期；状态缺失时从历史数据重建"""
+        if self.load_state() is None:
+            count = self.bootstrap(df)
+            print(f"✅ 生成梗详情分片 {count} 个")
+        else:
+            dates = HistoryFrame.date_strings(df['更新日期'])
+            mask = dates > (self.state.get('last_date') or '')
+            if replayed_date:
+                mask |= dates == replayed_date
+            rows = df[mask]
+            dirty = self._apply_rows(rows)
+            self._write_buckets(dirty)
+            print(f"✅ 增量更新梗详情分片 {rows['梗的名称'].nunique()} 个，搜索索引分桶 {len(dirty)} 个")
+
+        self.save_state()
+        return True
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+在线突增检测：每次轮询为每个梗增量更新EWMA均值/方差和最近若干次采样的斜率，
+单个样本O(1)更新，无需回看历史；状态保存在SQLite中，按梗单行读写
+"""
+
+import json
+import math
+import os
+import sqlite3
+import time
+
+from config import Config
+
+
+class SpikeDetector:
+    DB_FILENAME = "spike_state.sqlite"
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir if data_dir else Config.DATA_DIR
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+
+        self.conn = sqlite3.connect(os.path.join(self.data_dir, self.DB_FILENAME), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS meme_state (
+                name TEXT PRIMARY KEY,
+                samples INTEGER NOT NULL,
+                mean REAL NOT NULL,
+                var REAL NOT NULL,
+                window TEXT NOT NULL,
+                zscore REAL,
+                slope REAL,
+                rising_fast INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_meme_state_updated ON meme_state (updated_at)")
+        self.conn.commit()
+
+    @staticmethod
+    def relative_slope(window):
+        """最近若干次采样热度的最小二乘斜率，换算为相对均值的每小时变化比例"""
+        if len(window) < 3:
+            return None
+        n = len(window)
+        mean_t = sum(t for t, _ in window) / n
+        mean_h = sum(h for _, h in window) / n
+        denominator = sum((t - mean_t) ** 2 for t, _ in window)
+        if denominator == 0 or mean_h <= 0:
+            return None
+        slope = sum((t - mean_t) * (h - mean_h) for t, h in window) / denominator
+        return slope / mean_h
+
+    def update(self, state, heat, timestamp):
+        """用一个新样本更新单个梗的状态（O(1)，窗口长度固定）"""
+        alpha = Config.SPIKE_EWMA_ALPHA
+        hours = timestamp / 3600
+
+        if state is None:
+            state = {'samples': 0, 'mean': heat, 'var': 0.0, 'window': []}
+
+        # 先用更新前的分布计算当前样本的偏离程度
+        zscore = None
+        if state['samples'] >= Config.SPIKE_MIN_SAMPLES and state['var'] > 0:
+            zscore = (heat - state['mean']) / math.sqrt(state['var'])
+
+        # 指数加权的均值和方差增量更新
+        diff = heat - state['mean']
+        increment = alpha * diff
+        state['mean'] += increment
+        state['var'] = (1 - alpha) * (state['var'] + diff * increment)
+        state['samples'] += 1
+
+        window = state['window'] + [[hours, heat]]
+        state['window'] = window[-Config.SPIKE_WINDOW:]
+
+        slope = self.relative_slope(state['window'])
+        state['zscore'] = zscore
+        state['slope'] = slope
+        state['rising_fast'] = (
+            (zscore is not None and zscore >= Config.SPIKE_Z_THRESHOLD)
+            or (slope is not None and slope >= Config.SPIKE_SLOPE_THRESHOLD)
+        )
+        return state
+
+    def observe(self, samples, timestamp=None):
+        """记录一次轮询中各梗的热度，samples为{梗的名称: 热度}，返回本次突增的梗"""
+        timestamp = timestamp or time.time()
+        rising = []
+
+        for name, heat in samples.items():
+            row = self.conn.execute("SELECT * FROM meme_state WHERE name = ?", (name,)).fetchone()
+            state = None
+            if row:
+                state = {'samples': row['samples'], 'mean': row['mean'], 'var': row['var'],
+                         'window': json.loads(row['window'])}
+
+            state = self.update(state, float(heat), timestamp)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meme_state "
+                "(name, samples, mean, var, window, zscore, slope, rising_fast, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, state['samples'], state['mean'], state['var'], json.dumps(state['window']),
+                 state['zscore'], state['slope'], int(state['rising_fast']), timestamp),
+            )
+            if state['rising_fast']:
+                rising.append(name)
+
+        # 长时间未出现的梗不再保留状态
+        self.conn.execute(
+            "DELETE FROM meme_state WHERE updated_at < ?",
+            (timestamp - Config.SPIKE_STATE_TTL_DAYS * 86400,)
+        )
+        self.conn.commit()
+        return rising
+
+    def rising_fast(self, limit=None):
+        """最近一次轮询中被判定为突增的梗，按z分数和斜率排序"""
+        since = time.time() - Config.SPIKE_FRESHNESS_HOURS * 3600
+        rows = self.conn.execute(
+            "SELECT name, zscore, slope FROM meme_state WHERE rising_fast = 1 AND updated_at >= ? "
+            "ORDER BY COALESCE(zscore, 0) DESC, COALESCE(slope, 0) DESC LIMIT ?",
+            (since, limit if limit else -1),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        self.conn.close()
@@ -1,11 +1,15 @@
 import pandas as pd
 import os
 from datetime import datetime
+from aggregates import TrendAggregates
+from history_frame import HistoryFrame
 
 class MemeStorage:
-    def __init__(self, data=None, data_dir=None):
+    def __init__(self, data=None, data_dir=None, today=None):
         self.data = data
-        self.today = datetime.now().strftime("%Y-%m-%d")
+        self.history_data = None
+        self.aggregates = None
+        self.today = today if today else datetime.now().strftime("%Y-%m-%d")
         self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.data_dir = data_dir if data_dir else os.path.join(self.base_dir, 'data')
         
@@ -32,26 +36,45 @@ class MemeStorage:
             print(f"保存数据失败: {e}")
             return False
     
-    def update_history_file(self):
-        """更新历史数据文件"""
+    def update_history_file(self, history_data=None, aggregates=None):
+        """更新历史数据文件，传入history_data/aggregates时不再重新读取磁盘"""
         history_file = os.path.join(self.data_dir, "meme_data_history.csv")
         
         try:
+            # 写入前检查趋势聚合是否与当前历史文件一致，一致时只需增量追加今天的数据
+            if aggregates is None:
+                aggregates = TrendAggregates(self.data_dir)
+                if not (aggregates.load() and aggregates.is_fresh(history_file)):
+                    aggregates.reset()
+            
             # 如果历史文件存在，则加载并追加新数据
-            if os.path.exists(history_file):
-                history_data = pd.read_csv(history_file)
+            if history_data is not None or os.path.exists(history_file):
+                if history_data is None:
+                    history_data = HistoryFrame.load(history_file)
                 
                 # 删除今天已有的数据（如果有）
                 history_data = history_data[history_data['更新日期'] != self.today]
                 
                 # 合并新数据
-                combined_data = pd.concat([history_data, self.data])
+                combined_data = pd.concat([history_data, self.data], ignore_index=True)
             else:
                 combined_data = self.data
             
+            # 合并后的分类列会退化为普通对象列，重新转换为紧凑类型
+            combined_data = HistoryFrame.compact(combined_data)
+            
             # 保存更新后的历史数据
             combined_data.to_csv(history_file, index=False, encoding='utf-8-sig')
+            self.history_data = combined_data
             print(f"历史数据已更新到 {history_file}")
+            
+            # 增量更新趋势聚合
+            if aggregates.last_date is None:
+                aggregates.rebuild(combined_data)
+            else:
+                aggregates.append_day(self.today, self.data)
+            aggregates.save(history_file)
+            self.aggregates = aggregates
             return True
         except Exception as e:
             print(f"更新历史数据失败: {e}")
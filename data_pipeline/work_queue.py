@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+基于SQLite的持久化工作队列：协调进程把候选话题的梗判断和解释生成任务写入队列，
+一个或多个工作进程（可在多台机器上共享同一数据库文件）领取执行并回写结果。
+同一任务(类型, 键)只会执行一次，结果可重复读取
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import time
+
+from config import Config
+
+CLASSIFY = 'classify'
+EXPLAIN = 'explain'
+
+
+class WorkQueue:
+    def __init__(self, db_path=None):
+        self.db_path = db_path if db_path else Config.QUEUE_DB
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        # 手动管理事务，领取任务时使用BEGIN IMMEDIATE避免多个进程领到同一任务
+        self.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_until REAL,
+                result TEXT,
+                error TEXT,
+                updated_at REAL,
+                UNIQUE (kind, key)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)")
+
+    def enqueue(self, kind, keys):
+        """写入任务；已存在的任务不重复写入，失败或结果已过期的任务重新排队"""
+        now = time.time()
+        expired = now - Config.QUEUE_RESULT_TTL_DAYS * 86400
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 清理过期的已完成/已放弃任务，队列数据库不会无限增长；仍需要的任务随后重新写入
+            self.conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (expired,)
+            )
+            for key in keys:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO jobs (kind, key, updated_at) VALUES (?, ?, ?)", (kind, key, now)
+                )
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'pending', attempts = 0, error = NULL, updated_at = ? "
+                    "WHERE kind = ? AND key = ? AND status = 'failed'",
+                    (now, kind, key),
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def claim(self, worker, kinds=None):
+        """领取一个待执行或租约已过期的任务"""
+        now = time.time()
+        kinds = kinds or [CLASSIFY, EXPLAIN]
+        placeholders = ', '.join('?' for _ in kinds)
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 租约过期且已达到最大尝试次数的任务（工作进程在执行中被终止）不再领取，直接标记为失败
+            self.conn.execute(
+                f"UPDATE jobs SET status = 'failed', error = COALESCE(error, '租约过期'), lease_until = NULL, "
+                f"updated_at = ? WHERE kind IN ({placeholders}) AND status = 'running' AND lease_until < ? "
+                "AND attempts >= ?",
+                (now, *kinds, now, Config.QUEUE_MAX_ATTEMPTS),
+            )
+            row = self.conn.execute(
+                f"SELECT * FROM jobs WHERE kind IN ({placeholders}) AND "
+                "(status = 'pending' OR (status = 'running' AND lease_until < ?)) ORDER BY id LIMIT 1",
+                (*kinds, now),
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                (worker, now + Config.QUEUE_LEASE_SECONDS, now, row['id']),
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return dict(row)
+
+    def complete(self, job_id, worker, result):
+        """回写结果；只有当前持有租约的进程能写入，重复回写不会覆盖已完成的结果"""
+        cursor = self.conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (json.dumps(result, ensure_ascii=False), time.time(), job_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker, error):
+        """记录失败，未超过最大重试次数时重新排队"""
+        cursor = self.conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "error = ?, lease_until = NULL, updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (Config.QUEUE_MAX_ATTEMPTS, str(error), time.time(), job_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def results(self, kind, keys):
+        """读取已完成任务的结果，以及已经放弃的任务"""
+        keys = list(keys)
+        done, failed = {}, set()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            rows = self.conn.execute(
+                f"SELECT key, status, result FROM jobs WHERE kind = ? AND key IN ({placeholders})",
+                (kind, *chunk),
+            ).fetchall()
+            for row in rows:
+                if row['status'] == 'done':
+                    done[row['key']] = json.loads(row['result'])
+                elif row['status'] == 'failed':
+                    failed.add(row['key'])
+        return done, failed
+
+    def stats(self):
+        """按类型和状态统计任务数量"""
+        rows = self.conn.execute("SELECT kind, status, COUNT(*) AS count FROM jobs GROUP BY kind, status").fetchall()
+        return {f"{row['kind']}:{row['status']}": row['count'] for row in rows}
+
+    def close(self):
+        self.conn.close()
+
+
+class JobRunner:
+    """在当前进程中执行队列任务，复用采集器的梗判断和处理器的解释生成"""
+
+    def __init__(self, collector=None, processor=None):
+        from collectors import MemeCollector
+
+        self.collector = collector or MemeCollector(archive=False)
+        self.processor = processor
+
+    def execute(self, job):
+        # 使用失败时抛出异常的LLM调用：容错结果不写入队列，失败的任务按重试和租约逻辑重新执行
+        if job['kind'] == CLASSIFY:
+            return self.collector.classify_with_llm(job['key'])
+        if job['kind'] == EXPLAIN:
+            if self.processor is None:
+                from processor import MemeProcessor
+                self.processor = MemeProcessor([], openai_client=self.collector.openai_client)
+            return self.processor.explain_with_llm(job['key'])
+        raise ValueError(f"未知的任务类型: {job['kind']}")
+
+    def run_one(self, queue, worker, kinds=None):
+        """领取并执行一个任务，没有任务时返回False"""
+        job = queue.claim(worker, kinds)
+        if job is None:
+            return False
+        try:
+            queue.complete(job['id'], worker, self.execute(job))
+        except Exception as e:
+            print(f"任务执行失败 ({job['kind']} '{job['key']}'): {e}")
+            queue.fail(job['id'], worker, e)
+        return True
+
+
+class QueueCoordinator:
+    """协调进程：写入任务并等待工作进程回写结果，空闲时自己也参与执行"""
+
+    def __init__(self, queue=None, runner=None):
+        self.queue = queue or WorkQueue()
+        self.runner = runner
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:coordinator"
+
+    def run_jobs(self, kind, keys):
+        """提交一批任务并等待全部完成，返回{键: 结果}"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        self.queue.enqueue(kind, keys)
+        deadline = time.time() + Config.QUEUE_WAIT_TIMEOUT
+        while True:
+            done, failed = self.queue.results(kind, keys)
+            if len(done) + len(failed) >= len(keys):
+                break
+            if time.time() >= deadline:
+                print(f"等待{kind}任务超时，已完成 {len(done)}/{len(keys)}")
+                break
+            if not (Config.QUEUE_COORDINATOR_WORKS and self.runner and self.runner.run_one(self.queue, self.worker, [kind])):
+                time.sleep(Config.QUEUE_POLL_INTERVAL)
+        return done
+
+    def classify(self, collector, raw_data):
+        """通过队列判断候选话题是否为梗，并过滤采集结果"""
+        verdicts = self.run_jobs(CLASSIFY, collector.pending_classification)
+        collector.meme_cache.update(verdicts)
+        collector.pending_classification = []
+        # 未拿到结果的话题按容错策略保留
+        return [item for item in raw_data if verdicts.get(item['name'], True)]
+
+    def explain(self, processor):
+        """通过队列为即将入选的梗生成解释，写入处理器缓存"""
+        names = [name for name in processor.select_top_memes()['name'] if name not in processor.explanation_cache]
+        explanations = self.run_jobs(EXPLAIN, names)
+        processor.explanation_cache.update(explanations)
+        return len(explanations)
+
+
+def worker_loop(db_path=None):
+    """工作进程主循环，收到SIGTERM/SIGINT后执行完当前任务再退出"""
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+
+    queue = WorkQueue(db_path)
+    runner = JobRunner()
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"工作进程 {worker} 已启动")
+
+    while not stopping:
+        if not runner.run_one(queue, worker):
+            time.sleep(Config.QUEUE_POLL_INTERVAL)
+
+    queue.close()
+    print(f"工作进程 {worker} 已退出")
+
+
+def main():
+    """启动若干工作进程"""
+    parser = argparse.ArgumentParser(description='热梗数据管道工作进程')
+    parser.add_argument('--workers', type=int, default=1, help='本机启动的工作进程数')
+    parser.add_argument('--db', type=str, help='队列数据库路径（默认使用config中的配置）')
+    args = parser.parse_args()
+
+    processes = [
+        multiprocessing.Process(target=worker_loop, args=(args.db,))
+        for _ in range(max(1, args.workers))
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()